@@ -1,11 +1,15 @@
 # app/api/chat_routes.py
 from __future__ import annotations
+import asyncio
 import time
 from typing import List, Optional, Literal
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query
 from pydantic import BaseModel, Field
-from sqlalchemy.orm import Session
+from sqlalchemy import bindparam, select
+from sqlalchemy.orm import Session, selectinload
+
+from app.core.config import settings
 
 # DB session dependency (pakeisk, jei pas tave kitur)
 from app.db.session import get_db
@@ -14,7 +18,6 @@ from app.db.session import get_db
 from app.db.models.chat import (
     ChatSession,
     ChatMessage,
-    MessageResponse,
     ResponseSourceLayer,
 )
 
@@ -22,13 +25,16 @@ from app.db.models.chat import (
 from app.services.open_ai import (
     get_general_knowledge_response,
     get_rag_response,
+    is_ai_error,
 )
 
 # (nebūtina) semantinis RAG kontekstas iš dokumentų
 try:
     from app.services.semantic_search import get_service  # lazy singleton
+    from app.services.semantic_cache import get_answer_cache
 except Exception:
     get_service = None
+    get_answer_cache = None
 
 router = APIRouter(tags=["Chat"])
 
@@ -70,23 +76,42 @@ class SendMessageOut(BaseModel):
     response_meta: MessageResponseMeta
 
 # --------- Pagalbinės ---------
+# tik 2 stulpeliai (be ORM objektų), naudoja ix_chat_messages_session_id_id indeksą;
+# sakinys sukuriamas vieną kartą modulio lygyje, kiekvienam ėjimui – tik parametrai
+_HISTORY_STMT = (
+    select(ChatMessage.role, ChatMessage.content)
+    .where(ChatMessage.session_id == bindparam("session_id"))
+    .order_by(ChatMessage.id.desc())
+    .limit(bindparam("limit"))
+)
+
 def _build_history(db: Session, session_id: str, limit: int) -> List[dict]:
     if limit <= 0:
         return []
-    msgs = (
-        db.query(ChatMessage)
-        .filter(ChatMessage.session_id == session_id)
-        .order_by(ChatMessage.id.desc())
-        .limit(limit)
-        .all()
-    )
-    msgs.reverse()
+    rows = db.execute(_HISTORY_STMT, {"session_id": session_id, "limit": limit}).all()
     history: List[dict] = []
-    for m in msgs:
-        role = "assistant" if m.role == "assistant" else "user"
-        history.append({"role": role, "content": m.content})
+    for role, content in reversed(rows):
+        history.append({"role": "assistant" if role == "assistant" else "user", "content": content})
     return history
 
+def _response_meta(msg: ChatMessage) -> Optional[MessageResponseMeta]:
+    # meta laikoma pačioje žinutės eilutėje; user žinutėms source_layer = NULL
+    if msg.source_layer is None:
+        return None
+    return MessageResponseMeta(
+        response_time_ms=msg.response_time_ms,
+        source_layer=msg.source_layer,
+        source_qa_id=msg.source_qa_id,
+        source_document_chunks=msg.source_document_chunks,
+    )
+
+def _save(db: Session, *objs) -> None:
+    # commit + refresh blokuoja – async endpoint'ai kviečia per asyncio.to_thread
+    db.add_all(objs)
+    db.commit()
+    for obj in objs:
+        db.refresh(obj)
+
 # --------- Endpoint'ai ---------
 @router.post("/sessions", response_model=CreateSessionResponse, summary="Sukurti naują chat sesiją")
 def create_session(db: Session = Depends(get_db)):
@@ -98,35 +123,21 @@ def create_session(db: Session = Depends(get_db)):
 
 @router.get("/sessions/{session_id}", response_model=ChatSessionOut, summary="Gauti sesijos žinutes")
 def get_session(session_id: str, db: Session = Depends(get_db)):
-    sess = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+    # žinutės (su meta tose pačiose eilutėse) užkraunamos viena papildoma užklausa
+    sess = db.get(ChatSession, session_id, options=[selectinload(ChatSession.messages)])
     if not sess:
         raise HTTPException(status_code=404, detail="Session not found")
 
     out_msgs: List[ChatMessageOut] = []
     # jei nori laiko tvarka – gali pridėti .order_by(ChatMessage.id.asc())
     for m in sess.messages:
-        resp = (
-            db.query(MessageResponse)
-            .filter(MessageResponse.message_id == m.id)
-            .first()
-        )
-        resp_meta = (
-            MessageResponseMeta(
-                response_time_ms=resp.response_time_ms,
-                source_layer=resp.source_layer,
-                source_qa_id=resp.source_qa_id,
-                source_document_chunks=resp.source_document_chunks,
-            )
-            if resp
-            else None
-        )
         out_msgs.append(
             ChatMessageOut(
                 id=m.id,
                 role=m.role,
                 content=m.content,
                 timestamp=m.timestamp.isoformat() if m.timestamp else None,
-                response_details=resp_meta,
+                response_details=_response_meta(m),
             )
         )
 
@@ -141,34 +152,48 @@ def get_session(session_id: str, db: Session = Depends(get_db)):
     response_model=SendMessageOut,
     summary="Siųsti žinutę į LLM ir įrašyti atsakymą (GENERAL arba RAG)",
 )
-async def send_message(session_id: str, body: SendMessageIn, db: Session = Depends(get_db)):
+async def send_message(
+    session_id: str, body: SendMessageIn, background_tasks: BackgroundTasks, db: Session = Depends(get_db)
+):
     # 1) Sesija
-    sess = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+    sess = await asyncio.to_thread(db.get, ChatSession, session_id)
     if not sess:
         raise HTTPException(status_code=404, detail="Session not found")
 
-    # 2) Išsaugom user žinutę
+    # 2) User žinutė kol kas tik atmintyje – įrašoma kartu su atsakymu (7 žingsnis)
     user_msg = ChatMessage(session_id=session_id, role="user", content=body.message)
-    db.add(user_msg)
-    db.commit()
-    db.refresh(user_msg)
 
-    # 3) Istorija LLM'ui
-    history = _build_history(db, session_id, body.history_limit)
+    # 3-4) Istorija LLM'ui (ankstesnės žinutės; dabartinę open_ai servisas prideda pats) ir RAG kontekstas (rankinis + semantinis, jei paprašyta) – lygiagrečiai
+    use_semantic = body.mode == "rag" and body.use_semantic_docs
+    if use_semantic and get_service is None:
+        raise HTTPException(status_code=400, detail="Semantic search service is not available.")
 
-    # 4) RAG kontekstas (rankinis + semantinis, jei paprašyta)
+    history_future = asyncio.get_running_loop().run_in_executor(
+        None, _build_history, db, session_id, body.history_limit
+    )
     rag_context: List[str] = list(body.context)
-    if body.mode == "rag" and body.use_semantic_docs:
-        if get_service is None:
-            raise HTTPException(status_code=400, detail="Semantic search service is not available.")
+    if use_semantic:
         svc = get_service()
-        doc_chunks = svc.search_documents(body.message, body.language)
+        history, doc_chunks = await asyncio.gather(
+            history_future, svc.asearch_documents(body.message, body.language)
+        )
         rag_context.extend(doc_chunks)
+    else:
+        history = await history_future
 
     # 5) Kvietimas LLM
     start = time.perf_counter()
     if body.mode == "rag" and rag_context:
-        answer = await get_rag_response(body.message, rag_context)
+        # semantinis atsakymų kešas (tas pats kaip /ask-rag): panašus klausimas + tas pats kontekstas -> be OpenAI
+        # (RAG atsakymas nuo pokalbio istorijos nepriklauso – get_rag_response jos negauna)
+        use_cache = settings.SEMANTIC_CACHE_ENABLED and get_answer_cache is not None
+        cache = get_answer_cache() if use_cache else None
+        answer = await asyncio.to_thread(cache.lookup, body.message, "rag", rag_context) if cache else None
+        if answer is None:
+            answer = await get_rag_response(body.message, rag_context)
+            # klaidos tekstas (pvz., nėra API rakto) nekešuojamas
+            if cache is not None and answer and not is_ai_error(answer):
+                background_tasks.add_task(cache.store, body.message, answer, "rag", rag_context)
         source_layer = ResponseSourceLayer.RAG
         used_chunks = rag_context
     else:
@@ -177,33 +202,22 @@ async def send_message(session_id: str, body: SendMessageIn, db: Session = Depen
         used_chunks = None
     elapsed_ms = int((time.perf_counter() - start) * 1000)
 
-    # 6) Įrašom asistento žinutę
-    asst_msg = ChatMessage(session_id=session_id, role="assistant", content=answer or "")
-    db.add(asst_msg)
-    db.commit()
-    db.refresh(asst_msg)
-
-    # 7) Įrašom MessageResponse (meta)
-    meta = MessageResponse(
-        message_id=asst_msg.id,
+    # 6-7) User + asistento žinutės (su atsakymo meta) – viena transakcija, vienas commit
+    asst_msg = ChatMessage(
+        session_id=session_id,
+        role="assistant",
+        content=answer or "",
         response_time_ms=elapsed_ms,
         source_layer=source_layer,
         source_qa_id=None,                       # jei turėsi QA sluoksnį – užpildysi
         source_document_chunks=used_chunks,
     )
-    db.add(meta)
-    db.commit()
-    db.refresh(meta)
+    await asyncio.to_thread(_save, db, user_msg, asst_msg)
 
     return SendMessageOut(
         session_id=session_id,
         user_message_id=user_msg.id,
         assistant_message_id=asst_msg.id,
         answer=answer or "",
-        response_meta=MessageResponseMeta(
-            response_time_ms=meta.response_time_ms,
-            source_layer=meta.source_layer,
-            source_qa_id=meta.source_qa_id,
-            source_document_chunks=meta.source_document_chunks,
-        ),
+        response_meta=_response_meta(asst_msg),
     )
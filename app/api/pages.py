@@ -1,11 +1,21 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import HTMLResponse, RedirectResponse
 from fastapi.templating import Jinja2Templates
+from jinja2 import FileSystemBytecodeCache
+
+from app.core.config import settings
 
 router = APIRouter(tags=["Pages"], include_in_schema=False)
 
 templates = Jinja2Templates(directory="app/template")
 
+# šablonai parsinami kartą per workerį: be mtime tikrinimo kiekvienam request'ui,
+# o sukompiliuotas bytecode saugomas diske tarp paleidimų
+templates.env.auto_reload = settings.TEMPLATES_AUTO_RELOAD
+templates.env.bytecode_cache = FileSystemBytecodeCache()
+for _name in ("base.html", "tikras_chatas.html", "mokymai.html"):
+    templates.env.get_template(_name)
+
 @router.get("/chat", response_class=HTMLResponse)
 async def get_chat_page(request: Request):
     return templates.TemplateResponse(
@@ -1,17 +1,33 @@
 
 from __future__ import annotations
 import os
-import io
-from typing import List, Optional, Tuple
-
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
+import re
+import shutil
+import tempfile
+import asyncio
+import multiprocessing
+import threading
+import zipfile
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import AsyncGenerator, BinaryIO, Iterator, List, Optional, Tuple
+
+import numpy as np
+import orjson
+
+from fastapi import APIRouter, BackgroundTasks, Depends, HTTPException, Query as QueryParam, UploadFile, File, Form
+from fastapi.responses import Response, StreamingResponse
 from pydantic import BaseModel, Field
 from pydantic import ConfigDict  # pydantic v2
-from sqlalchemy.orm import Session
+from sqlalchemy import String, insert, tuple_, type_coerce, update
+from sqlalchemy.orm import Query, Session, raiseload, selectinload
 
-from app.db.session import get_db
+from app.core.config import settings
+from app.db.session import engine, get_db
 from app.db.models.qa import QAPair, QuestionVariation
 from app.db.models.documents import Document  # jei pas tave yra 'document.py', pakeisk į: from app.db.models.document import Document
+from app.utils.ids import new_ulid, new_ulids
 
 # Semantinės paieškos servisas (lazy)
 try:
@@ -19,6 +35,13 @@ try:
 except Exception:
     get_service = None
 
+# Excel skaitymas: calamine (Rust) greitesnis ir nekuria cell objektų; jei nėra – pandas default (openpyxl)
+try:
+    import python_calamine  # noqa: F401
+    _EXCEL_ENGINE: Optional[str] = "calamine"
+except ImportError:
+    _EXCEL_ENGINE = None
+
 router = APIRouter(tags=["QA & Documents"])
 
 # ----------------------- Pydantic schemos (LT) -----------------------
@@ -76,25 +99,99 @@ class DokumentuSarasasOut(BaseModel):
 UPLOAD_DIR = os.path.join(os.getcwd(), "uploads")
 os.makedirs(UPLOAD_DIR, exist_ok=True)
 
+# leidžiami plėtiniai – module lygyje, kad nebūtų kuriami per kiekvieną request'ą
+_QA_EXCEL_EXTS = frozenset({"xlsx", "xls"})
+_QA_EXTS = _QA_EXCEL_EXTS | {"docx"}
+_DOC_EXTS = frozenset({"pdf"})
+
+def _file_ext(name: str) -> str:
+    _, dot, ext = name.rpartition(".")
+    return ext.lower() if dot else ""
+
 def _ensure_semantic():
     if get_service is None:
         raise HTTPException(status_code=400, detail="Semantic search service is not available.")
     return get_service()
 
-def _chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
+def _chunk_offsets(text: str, chunk_size: int = 800, overlap: int = 100) -> Tuple[str, np.ndarray]:
+    """
+    Grąžina normalizuotą tekstą ir (N, 2) int64 masyvą su chunk'ų (start, end) pozicijomis.
+    Chunk'ai neperkerta žodžių; ribos randamos vienu np.searchsorted, be Python ciklo.
+    Patys str chunk'ai kuriami tik tada, kai jų reikia (žr. _iter_chunks).
+    """
+    # split/join (C lygyje) greitesnis už re.sub(r"\s+", " ", ...) tarpams sutraukti
     text = " ".join(text.split())
-    chunks: List[str] = []
-    start = 0
+    if not text:
+        return "", np.empty((0, 2), dtype=np.int64)
+    # po normalizacijos žodžius skiria lygiai vienas tarpas; jų pozicijas randa numpy.
+    # ASCII tekstas – 1 baitas simboliui; kitaip UTF-32, kad indeksai sutaptų su str
+    if text.isascii():
+        codes = np.frombuffer(text.encode("ascii"), dtype=np.uint8)
+    else:
+        codes = np.frombuffer(text.encode("utf-32-le"), dtype=np.uint32)
+    spaces = np.flatnonzero(codes == 32)
     n = len(text)
-    while start < n:
-        end = min(start + chunk_size, n)
-        chunk = text[start:end]
-        if chunk.strip():
-            chunks.append(chunk.strip())
-        if end == n:
-            break
-        start = max(0, end - overlap)
-    return chunks
+    wstart = np.concatenate(([0], spaces + 1))
+    wend = np.append(spaces, n)
+
+    stride = max(1, chunk_size - overlap)
+    # per ilgi "žodžiai" (URL, base64 ir pan.) supjaustomi gabalais: kai žodis ne ilgesnis už
+    # overlap + 1, joks chunk'as neviršija chunk_size (ir lango pradžia, ir "be spragų" pratęsimas)
+    limit = max(1, min(chunk_size, overlap + 1))
+    lengths = wend - wstart
+    if int(lengths.max()) > limit:
+        pieces = -(-lengths // limit)
+        word_of_piece = np.repeat(np.arange(len(wstart)), pieces)
+        piece_idx = np.arange(len(word_of_piece)) - np.repeat(np.cumsum(pieces) - pieces, pieces)
+        wstart = wstart[word_of_piece] + piece_idx * limit
+        wend = np.minimum(wstart + limit, wend[word_of_piece])
+    n_words = len(wstart)
+    # langas prasideda nuo žodžio, kuriame (ar po kurio) yra kas stride'inė pozicija
+    first = np.unique(np.searchsorted(wend, np.arange(0, n, stride), side="right"))
+    # paskutinis žodis, telpantis į chunk_size; bet ne mažiau nei iki kito lango pradžios,
+    # kad ilgi žodžiai nepaliktų spragų
+    fit = np.searchsorted(wend, wstart[first] + chunk_size, side="right") - 1
+    last = np.maximum(fit, np.append(first[1:], n_words) - 1)
+    # nukerpam langus po pirmojo, pasiekusio teksto pabaigą
+    k = int(np.argmax(last == n_words - 1)) + 1
+    return text, np.stack((wstart[first[:k]], wend[last[:k]]), axis=1)
+
+def _iter_chunks(text: str, offsets: np.ndarray) -> Iterator[str]:
+    # ribos visada sutampa su žodžių kraštais normalizuotame tekste,
+    # todėl chunk'ai niekada nebūna tušti ir jų nereikia strip'inti
+    for start, end in offsets.tolist():
+        yield text[start:end]
+
+def _chunk_text(text: str, chunk_size: int = 800, overlap: int = 100) -> List[str]:
+    return list(_iter_chunks(*_chunk_offsets(text, chunk_size, overlap)))
+
+def _qa_options(with_variations: bool = False) -> list:
+    """
+    QAPair krovimas be netikėtų lazy load'ų: variacijos (jei reikia) – vienu selectinload,
+    visa kita – raiseload, kad N+1 regresija iškart mestų klaidą.
+    """
+    if with_variations:
+        return [selectinload(QAPair.variations), raiseload("*")]
+    return [raiseload("*")]
+
+def _qa_query(db: Session, with_variations: bool = False) -> Query:
+    return db.query(QAPair).options(*_qa_options(with_variations))
+
+def _keyset_page(query: Query, created_col, id_col, cursor: Optional[str]) -> Query:
+    """
+    Keyset puslapiavimas (created_at DESC, id DESC): vietoj OFFSET – WHERE (created_at, id) < kursorius.
+    Kursorius – "created_at|id", kur created_at yra neapdorota DB reikšmė (žr. _raw_created),
+    todėl palyginimas tikslus ir SQLite'e. Vien created_at neužtenka – importuotos eilutės jį dalijasi.
+    """
+    query = query.order_by(created_col.desc(), id_col.desc())
+    if cursor:
+        created, _, last_id = cursor.rpartition("|")
+        query = query.filter(tuple_(_raw_created(created_col), id_col) < tuple_(created, last_id))
+    return query
+
+def _raw_created(created_col):
+    # be DateTime konvertavimo: SQLite'e tai tas pats tekstas, pagal kurį rikiuojama
+    return type_coerce(created_col, String)
 
 def _pick(*vals: Optional[str]) -> Optional[str]:
     """Paimk pirmą ne-tuščią reikšmę."""
@@ -111,17 +208,18 @@ def create_qa(payload: QAPoraSukurti, db: Session = Depends(get_db)):
     klausimas = payload.klausimas
     atsakymas = payload.atsakymas
 
+    # qa_id generuojam čia, ne DB pusėje – nereikia flush vien tam, kad jį gautume
+    qa_id = new_ulid()
     qa = QAPair(
+        qa_id=qa_id,
         question_lt=klausimas,
         answer_lt=atsakymas,
-      
     )
     db.add(qa)
-    db.flush()  # turėti qa_id
 
     for v in payload.variacijos:
         db.add(QuestionVariation(
-            qa_pair_id=qa.qa_id,
+            qa_pair_id=qa_id,
             variation_text=v.variacijos_tekstas,
             language=(v.kalba or "lt").lower()
         ))
@@ -140,26 +238,31 @@ def create_qa(payload: QAPoraSukurti, db: Session = Depends(get_db)):
     )
 
 @router.get("/qa", response_model=List[QAPoraOut], summary="Gauti Q&A sąrašą (LT laukai)")
-def list_qa(skip: int = 0, limit: int = 50, db: Session = Depends(get_db)):
-    items = (
-        db.query(QAPair)
-        .order_by(QAPair.created_at.desc())
-        .offset(skip)
-        .limit(limit)
-        .all()
+def list_qa(
+    skip: int = 0,
+    limit: int = 50,
+    cursor: Optional[str] = QueryParam(None, description="X-Next-Cursor reikšmė iš ankstesnio puslapio (vietoj skip)"),
+    db: Session = Depends(get_db),
+):
+    # tik reikalingi stulpeliai (be ORM objektų); DB duomenims pydantic validacija nereikalinga,
+    # todėl JSON iškart serializuojam su orjson (response_model lieka OpenAPI schemai)
+    query = _keyset_page(
+        db.query(QAPair.qa_id, QAPair.question_lt, QAPair.answer_lt, _raw_created(QAPair.created_at)),
+        QAPair.created_at, QAPair.qa_id, cursor,
     )
-    out: List[QAPoraOut] = []
-    for i in items:
-        out.append(QAPoraOut(
-            qa_id=i.qa_id,
-            klausimas=_pick(i.question_lt),
-            atsakymas=_pick(i.answer_lt) or "",
-        ))
-    return out
+    if not cursor and skip:
+        query = query.offset(skip)
+    rows = query.limit(limit).all()
+    out = [
+        {"qa_id": qa_id, "klausimas": _pick(klausimas), "atsakymas": _pick(atsakymas) or ""}
+        for qa_id, klausimas, atsakymas, _ in rows
+    ]
+    headers = {"X-Next-Cursor": f"{rows[-1][3]}|{rows[-1][0]}"} if rows and len(rows) == limit else None
+    return Response(content=orjson.dumps(out), media_type="application/json", headers=headers)
 
 @router.get("/qa/{qa_id}", response_model=QAPoraOut, summary="Gauti Q&A pagal ID (LT laukai)")
 def get_qa(qa_id: str, db: Session = Depends(get_db)):
-    qa = db.query(QAPair).filter(QAPair.qa_id == qa_id).first()
+    qa = db.get(QAPair, qa_id, options=_qa_options())
     if not qa:
         raise HTTPException(status_code=404, detail="QAPair not found")
     return QAPoraOut(
@@ -170,7 +273,7 @@ def get_qa(qa_id: str, db: Session = Depends(get_db)):
 
 @router.put("/qa/{qa_id}", response_model=QAPoraOut, summary="Atnaujinti Q&A (LT laukai)")
 def update_qa(qa_id: str, payload: QAPoraAtnaujinti, db: Session = Depends(get_db)):
-    qa = db.query(QAPair).filter(QAPair.qa_id == qa_id).first()
+    qa = db.get(QAPair, qa_id, options=_qa_options(with_variations=True))
     if not qa:
         raise HTTPException(status_code=404, detail="QAPair not found")
 
@@ -205,7 +308,8 @@ def update_qa(qa_id: str, payload: QAPoraAtnaujinti, db: Session = Depends(get_d
 
 @router.delete("/qa/{qa_id}", summary="Ištrinti Q&A")
 def delete_qa(qa_id: str, db: Session = Depends(get_db)):
-    qa = db.query(QAPair).filter(QAPair.qa_id == qa_id).first()
+    # variacijų reikia cascade trynimui
+    qa = db.get(QAPair, qa_id, options=_qa_options(with_variations=True))
     if not qa:
         raise HTTPException(status_code=404, detail="QAPair not found")
     if get_service is not None:
@@ -226,31 +330,58 @@ async def upload_qa_file(
     indeksuoti: bool = Form(True, description="Ar iškart indeksuoti į semantinę paiešką"),
     db: Session = Depends(get_db),
 ):
-    name = failas.filename or ""
-    ext = os.path.splitext(name)[1].lower()
+    ext = _file_ext(failas.filename or "")
 
-    if ext not in {".xlsx", ".xls", ".docx"}:
+    if ext not in _QA_EXTS:
         raise HTTPException(status_code=400, detail="Leidžiami: .xlsx, .xls, .docx")
 
-    data = await failas.read()
-    created, errors = 0, []
+    # importeriai skaito tiesiai iš UploadFile (SpooledTemporaryFile), be kopijos į bytes;
+    # pandas/XML parsinimas ir DB darbas – worker thread'e, ne event loop'e
+    if ext in _QA_EXCEL_EXTS:
+        new_pairs, to_reindex, errors = await asyncio.to_thread(
+            _import_qa_from_excel_lt, failas.file, db, indeksuoti
+        )
+    else:
+        new_pairs, to_reindex, errors = await asyncio.to_thread(_import_qa_from_docx_lt, failas.file, db)
+
+    # importeriai tik įrašo eilutes (bulk insert); indeksuojam prieš commit,
+    # kad visas įkėlimas būtų viena transakcija
+    if indeksuoti and get_service is not None and (new_pairs or to_reindex):
+        svc = get_service()
+        if new_pairs:
+            await svc.aadd_qa_pairs_batch(new_pairs)
+        if to_reindex:
+            await asyncio.to_thread(svc.update_qa_pairs_batch, to_reindex)
 
-    if ext in {".xlsx", ".xls"}:
-        created, errors = _import_qa_from_excel_lt(data, db, do_index=indeksuoti)
-    elif ext == ".docx":
-        created, errors = _import_qa_from_docx_lt(data, db, do_index=indeksuoti)
+    await asyncio.to_thread(db.commit)
+    return {"status": "ok", "importuota": len(new_pairs), "klaidos": errors}
 
-    return {"status": "ok", "importuota": created, "klaidos": errors}
+def _bulk_insert(db: Session, model, rows: List[dict]) -> None:
+    # ORM bulk INSERT (SQLAlchemy 2.0 insertmanyvalues): eilutės siunčiamos puslapiais
+    # po kelis šimtus viename INSERT, be ORM objektų ir unit-of-work
+    if rows:
+        db.execute(insert(model), rows)
+
+def _qa_pairs_for_index(qa_rows: List[dict]) -> List[QAPair]:
+    """
+    Transient QAPair objektai indeksavimui: eilutės jau įrašytos per _bulk_insert,
+    todėl į sesiją jų nededam (variations=[] – kad nebūtų lazy SELECT).
+    """
+    return [QAPair(**row, variations=[]) for row in qa_rows]
 
-def _import_qa_from_excel_lt(raw: bytes, db: Session, do_index: bool) -> Tuple[int, List[str]]:
+def _import_qa_from_excel_lt(src: BinaryIO, db: Session, do_index: bool) -> Tuple[List[QAPair], List[QAPair], List[str]]:
+    """
+    Grąžina (naujos Q&A, Q&A perindeksavimui dėl naujų variacijų, klaidos).
+    Eilutės įrašomos per _bulk_insert – commit ir indeksavimą daro upload_qa_file.
+    """
     import pandas as pd
     try:
-        xls = pd.ExcelFile(io.BytesIO(raw))
+        xls = pd.ExcelFile(src, engine=_EXCEL_ENGINE)
     except Exception as e:
-        return 0, [f"Excel skaitymo klaida: {e}"]
+        return [], [], [f"Excel skaitymo klaida: {e}"]
 
-    created = 0
     errors: List[str] = []
+    to_reindex: List[QAPair] = []
 
     # Sheet 'qa' (arba pirmas) su stulpeliais: 'klausimas' (nebūtina), 'atsakymas' (privaloma)
     sheet_name = "qa" if "qa" in [s.lower() for s in xls.sheet_names] else xls.sheet_names[0]
@@ -258,31 +389,30 @@ def _import_qa_from_excel_lt(raw: bytes, db: Session, do_index: bool) -> Tuple[i
     cols = {c.lower(): c for c in df.columns}
 
     if "atsakymas" not in cols:
-        return 0, [f"Trūksta stulpelio 'atsakymas' (sheet '{sheet_name}')"]
-
-    for idx, row in df.iterrows():
-        klausimas = str(row[cols["klausimas"]]).strip() if "klausimas" in cols and not pd.isna(row.get(cols["klausimas"])) else None
-        atsakymas = str(row[cols["atsakymas"]]).strip() if not pd.isna(row.get(cols["atsakymas"])) else ""
-
-        if not atsakymas:
-            errors.append(f"Eilutė {idx+2}: privalomas 'atsakymas'. Praleista.")
-            continue
-
-        qa = QAPair(
-            question_lt=klausimas,
-      
-            answer_lt=atsakymas,
-         
+        return [], [], [f"Trūksta stulpelio 'atsakymas' (sheet '{sheet_name}')"]
+
+    # validacija stulpeliais (pandas C lygyje), ne per kiekvieną langelį
+    atsakymai = df[cols["atsakymas"]].astype("string").str.strip()
+    if "klausimas" in cols:
+        klausimai = df[cols["klausimas"]].astype("string").str.strip()
+        klausimai = klausimai.astype(object).where(klausimai.notna(), None)
+    else:
+        klausimai = pd.Series([None] * len(df), index=df.index, dtype=object)
+
+    valid = atsakymai.fillna("").str.len() > 0
+    for idx in df.index[~valid]:
+        errors.append(f"Eilutė {idx+2}: privalomas 'atsakymas'. Praleista.")
+
+    rows = pd.DataFrame({"klausimas": klausimai, "atsakymas": atsakymai.astype(object)})[valid]
+    # qa_id generuojam čia (visi vienu new_ulids kvietimu), kad nereikėtų flush/refresh jam gauti
+    qa_rows = [
+        {"qa_id": qa_id, "question_lt": klausimas, "answer_lt": atsakymas}
+        for qa_id, (klausimas, atsakymas) in zip(
+            new_ulids(len(rows)), rows.itertuples(index=False, name=None)
         )
-        db.add(qa)
-        db.flush()
-        created += 1
-
-        if do_index and get_service is not None:
-            svc = get_service()
-            svc.add_qa_pair(qa)
-
-    db.commit()
+    ]
+    _bulk_insert(db, QAPair, qa_rows)
+    new_pairs = _qa_pairs_for_index(qa_rows)
 
     # (nebūtina) – jei norėsi LT variacijų atskiroje skiltyje,
     # gali pridėti antrą sheet, pvz. 'variacijos' (qa_id, variacijos_tekstas, kalba)
@@ -294,33 +424,76 @@ def _import_qa_from_excel_lt(raw: bytes, db: Session, do_index: bool) -> Tuple[i
         if vmissing:
             errors.append(f"Sheet 'variacijos' praleistas: trūksta {', '.join(vmissing)}")
         else:
-            count_var = 0
-            for idx, row in vdf.iterrows():
-                qa_id = row.get(vcols["qa_id"])
-                tekstas = row.get(vcols["variacijos_tekstas"])
-                kalba = (row.get(vcols["kalba"]) if "kalba" in vcols else "lt")
-                if qa_id is None or tekstas is None:
-                    errors.append(f"Variacijos eilutė {idx+2}: trūksta 'qa_id' arba 'variacijos_tekstas'. Praleista.")
-                    continue
-                db.add(QuestionVariation(
-                    qa_pair_id=str(qa_id).strip(),
-                    language=str(kalba).strip().lower() if kalba else "lt",
-                    variation_text=str(tekstas).strip()
-                ))
-                count_var += 1
-            db.commit()
+            # ta pati stulpelių validacija kaip 'qa' sheet'e; tušti langeliai – NA, ne 'nan'
+            v_ids = vdf[vcols["qa_id"]].astype("string").str.strip()
+            v_texts = vdf[vcols["variacijos_tekstas"]].astype("string").str.strip()
+            if "kalba" in vcols:
+                v_langs = vdf[vcols["kalba"]].astype("string").str.strip().str.lower()
+                v_langs = v_langs.mask(v_langs.fillna("") == "", "lt")
+            else:
+                v_langs = pd.Series("lt", index=vdf.index, dtype="string")
+
+            v_valid = (v_ids.fillna("").str.len() > 0) & (v_texts.fillna("").str.len() > 0)
+            for idx in vdf.index[~v_valid]:
+                errors.append(f"Variacijos eilutė {idx+2}: trūksta 'qa_id' arba 'variacijos_tekstas'. Praleista.")
+
+            var_rows = (
+                pd.DataFrame({"qa_pair_id": v_ids, "language": v_langs, "variation_text": v_texts})[v_valid]
+                .astype(object)
+                .to_dict(orient="records")
+            )
+            count_var = len(var_rows)
+            _bulk_insert(db, QuestionVariation, var_rows)
             if do_index and get_service is not None:
-                svc = get_service()
-                unique_ids = sorted(set([str(v).strip() for v in vdf[vcols["qa_id"]].tolist() if pd.notna(v)]))
-                for qid in unique_ids:
-                    qa = db.query(QAPair).filter(QAPair.qa_id == qid).first()
-                    if qa:
-                        svc.update_qa_pair(qa)
-                errors.append(f"Variacijų įkelta: {count_var} (perindeksuota {len(unique_ids)} Q&A).")
+                unique_ids = v_ids[v_valid].unique().tolist()
+                # vienas IN užklausimas (+ variacijos vienu selectinload), ne SELECT kiekvienam id
+                to_reindex = (
+                    _qa_query(db, with_variations=True)
+                    .filter(QAPair.qa_id.in_(unique_ids))
+                    .all()
+                )
+                errors.append(f"Variacijų įkelta: {count_var} (perindeksuota {len(to_reindex)} Q&A).")
+
+    return new_pairs, to_reindex, errors
+
+_W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
 
-    return created, errors
+def _iter_docx_paragraphs(src: BinaryIO) -> Iterator[str]:
+    """
+    Srautu skaito word/document.xml (be python-docx DOM) ir grąžina kiekvienos
+    <w:p> pastraipos tekstą. Apdorotos pastraipos atkabinamos nuo <w:body>,
+    todėl atmintyje laikoma tik einama pastraipa (ir atviri jos tėvai).
+    """
+    body = None
+    with zipfile.ZipFile(src) as z, z.open("word/document.xml") as f:
+        for event, el in ET.iterparse(f, events=("start", "end")):
+            if event == "start":
+                if body is None and el.tag == _W_NS + "body":
+                    body = el
+                continue
+            if el.tag != _W_NS + "p":
+                continue
+            parts: List[str] = []
+            for node in el.iter():
+                if node.tag == _W_NS + "t":
+                    parts.append(node.text or "")
+                elif node.tag == _W_NS + "tab":
+                    parts.append("\t")
+                elif node.tag in (_W_NS + "br", _W_NS + "cr"):
+                    parts.append("\n")
+            el.clear()
+            if body is not None:
+                # atviri elementai (pvz. lentelė) lieka parserio steke, todėl juos atkabinti saugu
+                body.clear()
+            yield "".join(parts)
+
+# vienas sukompiliuotas regex visiems klausimo/atsakymo prefiksams (vietoj lower() + startswith)
+_DOCX_QA_RE = re.compile(
+    r"(?:(?P<q>klausimas|k|q|q \(lt\))|(?P<a>atsakymas|a|ans|a \(lt\)))\s*:(?P<text>.*)",
+    re.IGNORECASE | re.DOTALL,
+)
 
-def _import_qa_from_docx_lt(raw: bytes, db: Session, do_index: bool) -> Tuple[int, List[str]]:
+def _import_qa_from_docx_lt(src: BinaryIO, db: Session) -> Tuple[List[QAPair], List[QAPair], List[str]]:
     """
     Tikimės paprasto formato DOCX (LT):
       Klausimas: ...
@@ -330,135 +503,323 @@ def _import_qa_from_docx_lt(raw: bytes, db: Session, do_index: bool) -> Tuple[in
       A: ...
     Poros kartojasi dokumente.
     """
-    from docx import Document as DocxDocument
-
     errors: List[str] = []
-    created = 0
-    doc = DocxDocument(io.BytesIO(raw))
-
-    paras = [p.text.strip() for p in doc.paragraphs if p.text and p.text.strip()]
-
-    def _norm(s: str) -> str:
-        return s.strip().lstrip("-").strip()
-
-    i = 0
-    while i < len(paras):
-        q = a = None
-        low = paras[i].lower()
-        if low.startswith(("klausimas:", "k:", "q:", "q (lt):")):
-            q = _norm(paras[i].split(":", 1)[1]); i += 1
-        if i < len(paras):
-            low2 = paras[i].lower()
-            if low2.startswith(("atsakymas:", "a:", "ans:", "a (lt):")):
-                a = _norm(paras[i].split(":", 1)[1]); i += 1
-
-        if a:
-            qa = QAPair(
-                question_lt=q,  # saugom abu
-              
-                answer_lt=a,
-             
-            )
-            db.add(qa)
-            db.flush()
-            created += 1
-            if do_index and get_service is not None:
-                svc = get_service()
-                svc.add_qa_pair(qa)
-        else:
-            # jei neatitiko maskės – praleidžiam šį paragrafą
-            i += 1
-
-    db.commit()
-    return created, errors
+    qa_rows: List[dict] = []
+    q: Optional[str] = None  # klausimas, laukiantis atsakymo kitoje pastraipoje
+    try:
+        # pastraipos tiesiai iš srautinio parserio, be viso sąrašo atmintyje
+        for para in _iter_docx_paragraphs(src):
+            para = para.strip()
+            if not para:
+                continue
+            m = _DOCX_QA_RE.match(para)
+            if m is None:
+                # jei neatitiko maskės – praleidžiam šį paragrafą
+                q = None
+                continue
+            text = m.group("text").strip().lstrip("-").strip()
+            if m.group("q"):
+                q = text
+                continue
+            if text:
+                qa_rows.append({"question_lt": q, "answer_lt": text})
+            q = None
+    except (zipfile.BadZipFile, KeyError, ET.ParseError) as e:
+        return [], [], [f"DOCX skaitymo klaida: {e}"]
+
+    for row, qa_id in zip(qa_rows, new_ulids(len(qa_rows))):
+        row["qa_id"] = qa_id
+    _bulk_insert(db, QAPair, qa_rows)
+    return _qa_pairs_for_index(qa_rows), [], errors
 
 # ---------------- Dokumentai: PDF įkėlimas ir indeksavimas ----------------
 
-@router.post("/docs/upload", response_model=DokumentasOut, summary="Įkelti PDF dokumentą ir indeksuoti")
+@router.post(
+    "/docs/upload",
+    response_model=DokumentasOut,
+    status_code=202,
+    summary="Įkelti PDF dokumentą (indeksuojama fone, busena='processing')",
+)
 async def upload_document_pdf(
+    background_tasks: BackgroundTasks,
     kalba: str = Form(..., min_length=2, max_length=2, description="Kalbos kodas, pvz. 'lt'"),
     failas: UploadFile = File(..., description="PDF dokumentas"),
     db: Session = Depends(get_db),
 ):
     name = failas.filename or ""
-    ext = os.path.splitext(name)[1].lower()
-    if ext != ".pdf":
+    if _file_ext(name) not in _DOC_EXTS:
         raise HTTPException(status_code=400, detail="Leidžiamas tik PDF.")
 
-    data = await failas.read()
-    if not data:
-        raise HTTPException(status_code=400, detail="Tuščias failas.")
+    svc = _ensure_semantic()
 
+    # kopijuojam srautu (1 MB buferiu), visas failas į atmintį neskaitomas
     target_path = os.path.join(UPLOAD_DIR, name)
     try:
-        with open(target_path, "wb") as f:
-            f.write(data)
+        size = await asyncio.to_thread(_save_upload, failas.file, target_path)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failo išsaugojimo klaida: {e}")
+    if not size:
+        raise HTTPException(status_code=400, detail="Tuščias failas.")
 
-    doc = Document(filename=name, language=kalba, status="uploaded")
-    db.add(doc)
-    db.commit()
-    db.refresh(doc)
+    doc = await asyncio.to_thread(_create_document, db, name, kalba)
 
-    text = _read_pdf_text(data)
-    if not text.strip():
-        raise HTTPException(status_code=400, detail="Nepavyko ištraukti teksto iš PDF.")
+    background_tasks.add_task(_ingest_document_pipeline, svc, doc.id, target_path, kalba)
 
-    chunks = _chunk_text(text)
-    if get_service is None:
-        raise HTTPException(status_code=400, detail="Semantic search service is not available.")
-    svc = get_service()
-    svc.index_document_chunks(chunks, document_id=doc.id, language=kalba)
+    return DokumentasOut(id=doc.id, failo_pavadinimas=doc.filename, kalba=doc.language, busena=doc.status)
 
-    doc.status = "indexed"
+def _create_document(db: Session, filename: str, language: str) -> Document:
+    doc = Document(filename=filename, language=language, status="processing")
+    db.add(doc)
     db.commit()
     db.refresh(doc)
+    return doc
 
-    return DokumentasOut(id=doc.id, failo_pavadinimas=doc.filename, kalba=doc.language, busena=doc.status)
+def _set_document_status(doc_id: str, status: str) -> None:
+    # fone / streamo pabaigoje request'o sesijos jau gali nebūti – vienas Core UPDATE
+    # tiesiai per pool'o jungtį (be ORM sesijos kūrimo / uždarymo)
+    with engine.begin() as conn:
+        conn.execute(update(Document).where(Document.id == doc_id).values(status=status))
 
-def _read_pdf_text(raw: bytes) -> str:
+def _save_upload(src: BinaryIO, target_path: str) -> int:
+    """
+    Srautu į laikiną failą tame pačiame kataloge; į target_path perkeliama (os.replace) tik
+    netuščias failas – tuščias upload'as neperrašo ir nepašalina jau esamo to paties vardo PDF.
+    Grąžina įrašytų baitų skaičių (0 – nieko neišsaugota).
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(target_path) or ".", suffix=".part")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            shutil.copyfileobj(src, f, 1 << 20)
+            size = f.tell()
+        if size:
+            os.replace(tmp_path, target_path)
+            return size
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    os.remove(tmp_path)
+    return 0
+
+_PIPELINE_DONE = object()
+
+async def _ingest_document_pipeline(svc, doc_id: str, pdf_path: str, language: str) -> None:
+    """
+    Fone: Load -> Chunk -> Embed -> Upsert, etapai sujungti ribotomis eilėmis
+    (asyncio.Queue(maxsize=...)), kad lėtas etapas stabdytų ankstesnįjį.
+    Pabaigoje Document.status = 'indexed' arba 'failed'.
+    """
+    embed_bs = max(1, settings.EMBED_BATCH_SIZE)
+    upsert_bs = max(1, settings.UPSERT_BATCH_SIZE)
+
+    text_q: asyncio.Queue = asyncio.Queue(maxsize=1)
+    chunk_q: asyncio.Queue = asyncio.Queue(maxsize=4)
+    emb_q: asyncio.Queue = asyncio.Queue(maxsize=4)
+    indexed = 0
+
+    async def load():
+        text = await asyncio.to_thread(_read_pdf_text_cached, pdf_path)
+        if not text.strip():
+            raise ValueError("Nepavyko ištraukti teksto iš PDF.")
+        await text_q.put(text)
+        await text_q.put(_PIPELINE_DONE)
+
+    async def chunk():
+        while (text := await text_q.get()) is not _PIPELINE_DONE:
+            norm_text, offsets = await asyncio.to_thread(_chunk_offsets, text)
+            for i in range(0, len(offsets), embed_bs):
+                await chunk_q.put(list(_iter_chunks(norm_text, offsets[i:i + embed_bs])))
+        await chunk_q.put(_PIPELINE_DONE)
+
+    async def embed():
+        while (batch := await chunk_q.get()) is not _PIPELINE_DONE:
+            embeddings = await svc.aembed_texts(batch, embed_bs)
+            await emb_q.put((batch, embeddings))
+        await emb_q.put(_PIPELINE_DONE)
+
+    async def upsert():
+        nonlocal indexed
+        pending_chunks: List[str] = []
+        pending_embs: List[List[float]] = []
+        while True:
+            item = await emb_q.get()
+            if item is not _PIPELINE_DONE:
+                pending_chunks.extend(item[0])
+                pending_embs.extend(item[1])
+            if pending_chunks and (item is _PIPELINE_DONE or len(pending_chunks) >= upsert_bs):
+                await asyncio.to_thread(svc.add_document_chunks, pending_chunks, pending_embs, doc_id, language)
+                indexed += len(pending_chunks)
+                pending_chunks, pending_embs = [], []
+            if item is _PIPELINE_DONE:
+                return
+
+    tasks = [asyncio.create_task(stage()) for stage in (load, chunk, embed, upsert)]
+    try:
+        await asyncio.gather(*tasks)
+        status = "indexed"
+        print(f"Document {doc_id}: indexed {indexed} chunks.")
+    except Exception as e:
+        for t in tasks:
+            t.cancel()
+        status = "failed"
+        print(f"Document {doc_id}: indexing failed: {e}")
+
+    await asyncio.to_thread(_set_document_status, doc_id, status)
+
+# nuo kiek puslapių verta naudoti procesų pool'ą (darbo perdavimas procesams nėra nemokamas)
+PDF_PARALLEL_MIN_PAGES = 8
+
+# vienas pool'as visam procesui, sukuriamas pirmą kartą prireikus. "spawn", ne "fork":
+# fork'as iš proceso su torch / chromadb ir kitomis gijomis gali užstrigti vaikiniame procese
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+
+def _get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=os.cpu_count() or 1,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pdf_pool
+
+def _pdf_page_text(page) -> str:
+    """
+    Puslapis be šriftų (nei tiesiogiai, nei Form XObject'uose) teksto neturi –
+    tokių puslapių (diagramos, skenai) turinio srauto visai neparsinam.
+    """
+    resources = page.get("/Resources")
+    if resources is not None:
+        resources = resources.get_object()
+        if "/Font" not in resources:
+            xobjects = resources.get("/XObject")
+            xobjects = xobjects.get_object() if xobjects is not None else {}
+            if not any(x.get_object().get("/Subtype") == "/Form" for x in xobjects.values()):
+                return ""
+    return page.extract_text() or ""
+
+def _extract_pdf_pages(path: str, start: int, stop: int) -> List[str]:
+    """
+    Puslapių [start, stop) tekstai; top-level, kad būtų picklable ProcessPoolExecutor'iui.
+    Kiekvienas worker'is PDF parsina vieną kartą visam savo puslapių intervalui.
+    """
+    from pypdf import PdfReader
+    pages = PdfReader(path, strict=False).pages
+    parts: List[str] = []
+    for i in range(start, stop):
+        try:
+            parts.append(_pdf_page_text(pages[i]))
+        except Exception:
+            parts.append("")
+    return parts
+
+def _read_pdf_text_pdfium(path: str) -> str:
+    import pypdfium2 as pdfium
+    pdf = pdfium.PdfDocument(path)
+    try:
+        parts: List[str] = []
+        for page in pdf:
+            textpage = page.get_textpage()
+            parts.append(textpage.get_text_bounded())
+            textpage.close()
+            page.close()
+        return "\n".join(parts)
+    finally:
+        pdf.close()
+
+def _read_pdf_text(path: str) -> str:
     """
-    Naudoja pypdf (PdfReader). Jei nepavyksta, bando pdfminer.six.
+    Pirmiausia pypdfium2 (C++ PDFium – kelis kartus greitesnis už pypdf).
+    Jei jo nėra ar nepavyksta – pypdf (PdfReader); ilgų PDF puslapiai išskirstomi
+    per procesų pool'ą (pypdf – grynas Python, riboja GIL). Galiausiai pdfminer.six.
     """
+    try:
+        return _read_pdf_text_pdfium(path)
+    except Exception:
+        pass
+
     text = ""
     try:
         from pypdf import PdfReader
-        reader = PdfReader(io.BytesIO(raw))
-        parts: List[str] = []
-        for page in reader.pages:
-            try:
-                parts.append(page.extract_text() or "")
-            except Exception:
-                parts.append("")
+        reader = PdfReader(path, strict=False)
+        n_pages = len(reader.pages)
+        workers = min(os.cpu_count() or 1, n_pages)
+        if n_pages >= PDF_PARALLEL_MIN_PAGES and workers > 1:
+            # po vieną ištisinį puslapių intervalą worker'iui, tvarka išlaikoma
+            bounds = np.linspace(0, n_pages, workers + 1).astype(int).tolist()
+            ranges = _get_pdf_pool().map(_extract_pdf_pages, repeat(path), bounds[:-1], bounds[1:])
+            parts = [t for r in ranges for t in r]
+        else:
+            parts: List[str] = []
+            for page in reader.pages:
+                try:
+                    parts.append(_pdf_page_text(page))
+                except Exception:
+                    parts.append("")
         text = "\n".join(parts)
     except Exception:
         try:
             from pdfminer.high_level import extract_text
-            text = extract_text(io.BytesIO(raw))
+            text = extract_text(path)
         except Exception:
             text = ""
     return text
 
+def _read_pdf_text_cached(path: str) -> str:
+    """
+    PDF tekstas su kešu šalia failo (<pdf>.txt): perindeksuojant tas pats PDF
+    nebeparsinamas, kol failas nepasikeitė (kešas ne senesnis už PDF pagal mtime).
+    """
+    cache_path = path + ".txt"
+    try:
+        if os.path.getmtime(cache_path) >= os.path.getmtime(path):
+            with open(cache_path, encoding="utf-8") as f:
+                return f.read()
+    except OSError:
+        pass
+
+    text = _read_pdf_text(path)
+    if text.strip():
+        try:
+            tmp_path = cache_path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp_path, cache_path)
+        except OSError:
+            pass
+    return text
+
 # ---------------- Dokumentų sąrašas / get / delete / reindex ----------------
 
 @router.get("/docs", response_model=DokumentuSarasasOut, summary="Sąrašas dokumentų")
-def list_documents(db: Session = Depends(get_db)):
-    items = db.query(Document).order_by(Document.created_at.desc()).all()
+def list_documents(
+    response: Response,
+    limit: Optional[int] = QueryParam(None, ge=1, description="Puslapio dydis (be jo – visi dokumentai)"),
+    cursor: Optional[str] = QueryParam(None, description="X-Next-Cursor reikšmė iš ankstesnio puslapio"),
+    db: Session = Depends(get_db),
+):
+    query = _keyset_page(
+        db.query(Document, _raw_created(Document.created_at)), Document.created_at, Document.id, cursor
+    )
+    if limit is not None:
+        query = query.limit(limit)
+    rows = query.all()
+    if limit is not None and len(rows) == limit:
+        response.headers["X-Next-Cursor"] = f"{rows[-1][1]}|{rows[-1][0].id}"
     return DokumentuSarasasOut(
-        irasai=[DokumentasOut(id=i.id, failo_pavadinimas=i.filename, kalba=i.language, busena=i.status) for i in items]
+        irasai=[DokumentasOut(id=i.id, failo_pavadinimas=i.filename, kalba=i.language, busena=i.status) for i, _ in rows]
     )
 
 @router.get("/docs/{doc_id}", response_model=DokumentasOut, summary="Gauti dokumentą")
 def get_document(doc_id: str, db: Session = Depends(get_db)):
-    doc = db.query(Document).filter(Document.id == doc_id).first()
+    doc = db.get(Document, doc_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     return DokumentasOut(id=doc.id, failo_pavadinimas=doc.filename, kalba=doc.language, busena=doc.status)
 
 @router.delete("/docs/{doc_id}", summary="Trinti dokumentą (tik DB įrašą)")
 def delete_document(doc_id: str, db: Session = Depends(get_db)):
-    doc = db.query(Document).filter(Document.id == doc_id).first()
+    doc = db.get(Document, doc_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
     db.delete(doc)
@@ -466,9 +827,8 @@ def delete_document(doc_id: str, db: Session = Depends(get_db)):
     # (pasirinktinai) – gali trinti embeddings ChromaDB pagal document_id, jei servise taip saugai metadatas
     return {"status": "ok", "deleted": doc_id}
 
-@router.post("/docs/{doc_id}/reindex", summary="Perindeksuoti PDF dokumentą iš naujo")
-def reindex_document(doc_id: str, db: Session = Depends(get_db)):
-    doc = db.query(Document).filter(Document.id == doc_id).first()
+def _load_document_chunks(doc_id: str, db: Session) -> Tuple[Document, List[str]]:
+    doc = db.get(Document, doc_id)
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
 
@@ -476,19 +836,47 @@ def reindex_document(doc_id: str, db: Session = Depends(get_db)):
     if not os.path.exists(path):
         raise HTTPException(status_code=400, detail="Failas nerastas diske – įkelk iš naujo.")
 
-    with open(path, "rb") as f:
-        raw = f.read()
-    text = _read_pdf_text(raw)
+    text = _read_pdf_text_cached(path)
     if not text.strip():
         raise HTTPException(status_code=400, detail="Nepavyko ištraukti teksto iš PDF.")
 
-    chunks = _chunk_text(text)
-    if get_service is None:
-        raise HTTPException(status_code=400, detail="Semantic search service is not available.")
-    svc = get_service()
+    return doc, _chunk_text(text)
+
+@router.post("/docs/{doc_id}/reindex", summary="Perindeksuoti PDF dokumentą iš naujo")
+def reindex_document(doc_id: str, db: Session = Depends(get_db)):
+    doc, chunks = _load_document_chunks(doc_id, db)
+    svc = _ensure_semantic()
     svc.index_document_chunks(chunks, document_id=doc.id, language=doc.language)
 
     doc.status = "indexed"
     db.commit()
     db.refresh(doc)
     return {"status": "ok", "reindexed": doc_id, "chunks": len(chunks)}
+
+@router.post(
+    "/docs/{doc_id}/reindex-stream",
+    summary="Perindeksuoti PDF dokumentą su progresu (SSE)",
+    description="Chunk'ai indeksuojami mikro-batch'ais; kiekvienam batch'ui siunčiamas "
+                "`data: {\"indexed\": n, \"total\": N}`, pabaigoje `event: done`.",
+)
+async def reindex_document_stream(doc_id: str, db: Session = Depends(get_db)):
+    doc, chunks = await asyncio.to_thread(_load_document_chunks, doc_id, db)
+    svc = _ensure_semantic()
+    language = doc.language
+
+    async def gen() -> AsyncGenerator[bytes, None]:
+        status = "failed"
+        try:
+            async for done, total in svc.index_document_chunks_stream(
+                chunks, document_id=doc_id, language=language, batch_size=settings.EMBED_BATCH_SIZE
+            ):
+                yield b"data: " + orjson.dumps({"indexed": done, "total": total}) + b"\n\n"
+            status = "indexed"
+            yield b"event: done\ndata: " + orjson.dumps({"status": status, "chunks": len(chunks)}) + b"\n\n"
+        finally:
+            await asyncio.to_thread(_set_document_status, doc_id, status)
+
+    return StreamingResponse(
+        gen(), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -1,22 +1,26 @@
 # app/api/semantic_routes.py
+import asyncio
+import orjson
 from typing import List, Optional, Dict, Any, AsyncGenerator
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, BackgroundTasks, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, constr
 from types import SimpleNamespace
 
 # Servisas – spėjame, kad tavo klasę įsidėjai į app/services/semantic_search.py
 # Jei failas vadinasi kitaip, atitinkamai pataisyk importą:
-from app.services.semantic_search import SemanticSearchService, search_service  # type: ignore
+from app.services.semantic_search import SemanticSearchService, get_service  # type: ignore
 from typing import List, Dict, Optional, AsyncGenerator
 from fastapi import APIRouter, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, constr
 
 from app.core.config import settings
+from app.services.semantic_cache import SemanticAnswerCache, get_answer_cache
 from app.services.open_ai import (
     get_general_knowledge_response,
     get_rag_response,
+    is_ai_error,
     stream_general_knowledge_response,
 )
 
@@ -44,6 +48,15 @@ def ensure_api_key():
     if not settings.OPENAI_API_KEY:
         raise HTTPException(status_code=400, detail="OpenAI API key is not configured.")
 
+# SSE: proxy (nginx) neturi buferizuoti – kitaip gabalai ateina vienu kartu
+_SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+_SSE_DATA = b"data: "
+_SSE_END = b"\n\n"
+_SSE_DONE = b"event: done\ndata: end\n\n"
+
+def _answer_cache() -> Optional[SemanticAnswerCache]:
+    return get_answer_cache() if settings.SEMANTIC_CACHE_ENABLED else None
+
 # ==== Endpoint'ai ====
 @router.get("/health", response_model=HealthResponse)
 async def health():
@@ -56,9 +69,19 @@ async def health():
  
     description="Priima tik `{ message }` ir grąžina pilną atsakymą.",
 )
-async def ask(req: ChatRequest):
+async def ask(req: ChatRequest, background_tasks: BackgroundTasks):
     ensure_api_key()
+    cache = _answer_cache()
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.lookup, req.message, "ask")
+        if cached is not None:
+            return {"answer": cached}
+
     answer = await get_general_knowledge_response(req.message)
+    # klaidos tekstas (pvz., OpenAI nepasiekiamas) nekešuojamas
+    if cache is not None and answer and not is_ai_error(answer):
+        # įrašom po atsakymo išsiuntimo
+        background_tasks.add_task(cache.store, req.message, answer, "ask")
     return {"answer": answer or ""}
 
 @router.post(
@@ -67,9 +90,17 @@ async def ask(req: ChatRequest):
     
     description="Priima `{ message, context[] }` ir grąžina atsakymą panaudojant kontekstą.",
 )
-async def ask_rag(req: RagRequest):
+async def ask_rag(req: RagRequest, background_tasks: BackgroundTasks):
     ensure_api_key()
+    cache = _answer_cache()
+    if cache is not None:
+        cached = await asyncio.to_thread(cache.lookup, req.message, "rag", req.context)
+        if cached is not None:
+            return {"answer": cached}
+
     answer = await get_rag_response(req.message, req.context)
+    if cache is not None and answer and not is_ai_error(answer):
+        background_tasks.add_task(cache.store, req.message, answer, "rag", req.context)
     return {"answer": answer or ""}
 
 @router.get(
@@ -81,11 +112,12 @@ async def ask_stream(message: str = Query(..., min_length=1, description="Vartot
     ensure_api_key()
 
     async def gen() -> AsyncGenerator[bytes, None]:
+        # JSON rėmelis: gabalai su \n nebesulaužo SSE formato; orjson iškart grąžina bytes
         async for piece in stream_general_knowledge_response(message, history=None):
-            yield f"data: {piece}\n\n".encode("utf-8")
-        yield b"event: done\ndata: end\n\n"
+            yield b"".join((_SSE_DATA, orjson.dumps({"content": piece}), _SSE_END))
+        yield _SSE_DONE
 
-    return StreamingResponse(gen(), media_type="text/event-stream")
+    return StreamingResponse(gen(), media_type="text/event-stream", headers=_SSE_HEADERS)
 
 
 
@@ -126,15 +158,6 @@ class DocumentIndexRequest(BaseModel):
 class DocumentSearchResponse(BaseModel):
     chunks: List[str]
 
-# ---------- helper: singleton servisui gauti ----------
-
-def get_service() -> SemanticSearchService:
-    # Jei globalus search_service None – inicializuojam čia
-    global search_service  # atkeliauja iš semantic_search modulio
-    if search_service is None:
-        search_service = SemanticSearchService()
-    return search_service
-
 # ---------- Q&A indeksavimo/paieškos endpointai ----------
 
 @router.post("/qa/sync")
@@ -148,12 +171,12 @@ def sync_index(pairs: List[QAPairIn]):
                    for v in p.variations]
         qa_ns = SimpleNamespace(
             qa_id=p.qa_id,
-            question_en=p.question_en,
-            question_ka=p.question_ka,
+            question_lt=p.question_lt,
             variations=vars_ns
         )
         to_sync.append(qa_ns)
-    svc.sync_index_from_db(to_sync)  # tipų tikrinimas servise tik anotacijoms; runtime veiks
+    # servisas priima batch'ų iteratorių; čia visi įrašai jau atmintyje – vienas batch'as
+    svc.sync_index_from_db([to_sync])  # tipų tikrinimas servise tik anotacijoms; runtime veiks
     return {"status": "ok", "count": len(pairs)}
 
 @router.post("/qa", summary="Pridėti Q&A į indeksą")
@@ -163,8 +186,7 @@ def add_qa(qa: QAPairIn):
                for v in qa.variations]
     qa_ns = SimpleNamespace(
         qa_id=qa.qa_id,
-        question_en=qa.question_en,
-  
+        question_lt=qa.question_lt,
         variations=vars_ns
     )
     svc.add_qa_pair(qa_ns)
@@ -179,8 +201,7 @@ def update_qa(qa_id: str, qa: QAPairIn):
                for v in qa.variations]
     qa_ns = SimpleNamespace(
         qa_id=qa.qa_id,
-        question_en=qa.question_en,
-
+        question_lt=qa.question_lt,
         variations=vars_ns
     )
     svc.update_qa_pair(qa_ns)
@@ -205,9 +226,10 @@ def add_variation(variation: VariationCreate):
     return {"status": "ok"}
 
 @router.get("/qa/match", response_model=Optional[MatchResponse], summary="Rasti geriausią atitikmenį")
-def find_match(query: str = Query(..., min_length=1), language: str = Query(..., min_length=1)):
+async def find_match(query: str = Query(..., min_length=1), language: str = Query(..., min_length=1)):
     svc = get_service()
-    result = svc.find_best_match(query, language)
+    # kelios vienu metu atėjusios užklausos apdorojamos vienu batch'u
+    result = await svc.afind_best_match(query, language)
     # result jau grąžina {"qa_id","language","distance"} arba None
     return result
 
@@ -1,10 +1,83 @@
 # app/core/config.py
-from typing import Optional
+from typing import List, Optional
 from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     OPENAI_API_KEY: Optional[str] = None
     OPENAI_MODEL: str = "gpt-4o-mini"  # default modelis, jei .env nerasta
+    # bendras OpenAI HTTP klientas (keep-alive, HTTP/2 jei įdiegtas httpx[http2])
+    OPENAI_TIMEOUT_SECONDS: float = 30.0
+    OPENAI_MAX_CONNECTIONS: int = 50
+    OPENAI_MAX_KEEPALIVE_CONNECTIONS: int = 20
+
+    # Dokumentų indeksavimo pipeline (embed ir upsert batch'ai nepriklausomi)
+    EMBED_BATCH_SIZE: int = 64
+    UPSERT_BATCH_SIZE: int = 512
+    # Q&A indekso add() dalies dydis (Chroma turi max batch ribą, ~5000)
+    QA_INDEX_ADD_BATCH_SIZE: int = 4000
+    # startup sync: kiek DB batch'ų paruošiama fone, kol modelis koduoja ankstesnį
+    SYNC_PREFETCH_BATCHES: int = 2
+    # (nebūtina) atskiras GPU embedding servisas dokumentų indeksavimui;
+    # turi naudoti tą patį modelį kaip SemanticSearchService. Paieška lieka lokali (CPU).
+    EMBED_SERVICE_URL: Optional[str] = None
+    EMBED_SERVICE_BATCH_SIZE: int = 128
+    EMBED_CONCURRENCY: int = 10  # kiek batch'ų vienu metu siunčiama į embed servisą
+    # Lokalaus embedding modelio backend'as: "torch" (numatytas), "onnx" arba "openvino"
+    # (reikia `pip install sentence-transformers[onnx]` / `[openvino]`); eksportuotas modelis
+    # išsaugomas EMBED_MODEL_CACHE_DIR ir kitą kartą kraunamas iš ten
+    EMBED_BACKEND: str = "torch"
+    EMBED_MODEL_CACHE_DIR: str = "./.cache/models"
+    # tik "onnx": dinaminė INT8 kvantizacija ("arm64", "avx2", "avx512", "avx512_vnni");
+    # prieš įjungiant verta palyginti paieškos rezultatus su FP32 modeliu
+    EMBED_ONNX_QUANTIZATION: Optional[str] = None
+    EMBED_TORCH_THREADS: Optional[int] = None  # torch backend'ui: torch.set_num_threads (None – default)
+
+    # Semantinis /ask ir /ask-rag atsakymų kešas: max cosine distance iki jau atsakyto klausimo.
+    # Išjungtas pagal nutylėjimą – panašus klausimas gauna kito klausimo atsakymą; įrašai galioja
+    # SEMANTIC_CACHE_TTL_SECONDS, viršijus SEMANTIC_CACHE_MAX_ENTRIES seniausi išmetami
+    SEMANTIC_CACHE_ENABLED: bool = False
+    SEMANTIC_CACHE_MAX_DISTANCE: float = 0.05
+    SEMANTIC_CACHE_TTL_SECONDS: float = 3600.0
+    SEMANTIC_CACHE_MAX_ENTRIES: int = 5000
+
+    # find_best_match rezultatų kešas (tas pats klausimas + kalba); išvalomas pasikeitus Q&A indeksui
+    MATCH_CACHE_SIZE: int = 4096
+    MATCH_CACHE_TTL_SECONDS: float = 300.0
+    # bendras visiems worker'iams: pakeitus Q&A indeksą čia įrašoma nauja žymė, kiti worker'iai
+    # ją pamato kitos paieškos metu ir išvalo savo find_best_match kešą
+    QA_INDEX_VERSION_FILE: str = "./.cache/qa_index.version"
+    # pavienės variacijos (/qa/variation) indeksuojamos fone micro-batch'ais:
+    # laukiama iki VARIATION_BATCH_WAIT_SECONDS arba kol susikaups VARIATION_BATCH_SIZE
+    VARIATION_BATCH_SIZE: int = 64
+    VARIATION_BATCH_WAIT_SECONDS: float = 0.05
+
+    # find_best_match: jei tarp 1 fazės kandidatų, arčiau nei šis L2 atstumas, yra tiksliai tas pats
+    # klausimas (be raidžių dydžio / tarpų skirtumų) – 2 fazės re-rank'as praleidžiamas (0 – visada re-rank'inti)
+    EARLY_ACCEPT_DISTANCE: float = 0.15
+    # /qa/match: per MATCH_BATCH_WAIT_SECONDS atėję tos pačios kalbos klausimai sujungiami
+    # į vieną embed + Chroma užklausą (daugiausia MATCH_BATCH_SIZE)
+    MATCH_BATCH_WAIT_SECONDS: float = 0.005
+    MATCH_BATCH_SIZE: int = 32
+    # paleidus modelis ir Chroma indeksai "pašildomi" viena užklausa; jei > 0 – kartojama kas
+    # INDEX_KEEP_WARM_SECONDS, kad ilgai nenaudojamo proceso indeksas neiškristų iš page cache
+    INDEX_KEEP_WARM_SECONDS: float = 0.0
+    # užklausų embedding'ų kešas (tas pats tekstas -> tas pats vektorius, be modelio kvietimo)
+    QUERY_EMBED_CACHE_SIZE: int = 2048
+    QUERY_EMBED_CACHE_TTL_SECONDS: float = 3600.0
+    # 2 fazės kandidatų (originalių klausimų) embedding'ai saugomi diske float16 matrica (memmap),
+    # kad re-rank'ui nereikėtų jų kaskart perkoduoti modeliu
+    RERANK_STORE_DIR: str = "./.cache/rerank"
+
+    # CORS: konkretūs frontend'o adresai (.env: CORS_ALLOW_ORIGINS='["https://..."]');
+    # preflight atsakymą naršyklė kešuoja CORS_MAX_AGE sekundžių
+    CORS_ALLOW_ORIGINS: List[str] = ["*"]
+    CORS_MAX_AGE: int = 86400
+
+    # /static failų Cache-Control max-age (sek.); failams su hash'u vardėje – metai, immutable
+    STATIC_MAX_AGE: int = 3600
+
+    # True – šablonai perskaitomi pasikeitus failui (patogu kuriant)
+    TEMPLATES_AUTO_RELOAD: bool = False
 
     class Config:
         env_file = ".env"
@@ -1,3 +1,3 @@
 from .qa import QAPair, QuestionVariation
 from .documents import Document
-from .chat import ChatSession, ChatMessage, MessageResponse, ResponseSourceLayer
\ No newline at end of file
+from .chat import ChatSession, ChatMessage, ResponseSourceLayer
\ No newline at end of file
@@ -1,11 +1,12 @@
-import uuid
-from sqlalchemy import Column, String, DateTime
+from sqlalchemy import Column, String, DateTime, Index
 from sqlalchemy.sql import func
 from app.db.base import Base
+from app.utils.ids import new_ulid
 
 class Document(Base):
     __tablename__ = "documents"
-    id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    __table_args__ = (Index("ix_documents_created_at_id", "created_at", "id"),)
+    id = Column(String, primary_key=True, default=new_ulid)
     filename = Column(String, nullable=False)
     language = Column(String(2), nullable=False)
     status = Column(String, default="indexed")
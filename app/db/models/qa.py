@@ -1,12 +1,14 @@
-import uuid
-from sqlalchemy import Column, String, Text, DateTime, Integer, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, Integer, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from app.db.base import Base
+from app.utils.ids import new_ulid
 
 class QAPair(Base):
     __tablename__ = "qa_pairs"
-    qa_id = Column(String, primary_key=True, default=lambda: str(uuid.uuid4()))
+    # sąrašui: ORDER BY created_at DESC, qa_id DESC + keyset kursorius (indeksas skaitomas atbuline tvarka)
+    __table_args__ = (Index("ix_qa_pairs_created_at_qa_id", "created_at", "qa_id"),)
+    qa_id = Column(String, primary_key=True, default=new_ulid)
     question_lt = Column(Text, nullable=True)
     answer_lt = Column(Text, nullable=False)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
@@ -16,6 +18,8 @@ class QAPair(Base):
 
 class QuestionVariation(Base):
     __tablename__ = "question_variations"
+    # selectinload / kaskadinis trynimas: WHERE qa_pair_id IN (...); kalba – antras stulpelis
+    __table_args__ = (Index("ix_question_variations_qa_pair_id_language", "qa_pair_id", "language"),)
     id = Column(Integer, primary_key=True, index=True)
     qa_pair_id = Column(String, ForeignKey("qa_pairs.qa_id"), nullable=False)
     variation_text = Column(Text, nullable=False)
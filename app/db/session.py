@@ -1,12 +1,41 @@
-from sqlalchemy import create_engine
+import orjson
+from sqlalchemy import create_engine, event, text
 from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
 
 SQLALCHEMY_DATABASE_URL = "sqlite:///./education_db.db"
 
+def _json_serializer(value) -> str:
+    # JSON stulpeliams (pvz., ChatMessage.source_document_chunks) – orjson vietoj json.dumps
+    return orjson.dumps(value).decode("utf-8")
+
+# jungtys laikomos pool'e (ne atidaromos kiekvienam request'ui). Sync route'ai vykdomi AnyIO
+# threadpool'e (default 40 gijų), tad pool_size + max_overflow = 40 – kiekviena gija gauna jungtį
+# ir nelaukia pool_timeout; laukimas įmanomas tik su background task'ais, todėl riba trumpa
 engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args={"check_same_thread": False}
+    SQLALCHEMY_DATABASE_URL,
+    connect_args={"check_same_thread": False},
+    poolclass=QueuePool,
+    pool_size=10,
+    max_overflow=30,
+    pool_timeout=10,
+    # kompiliuotų SQL kešas (default 500) – kad visos route'ų užklausos tilptų be išstūmimo
+    query_cache_size=1200,
+    json_serializer=_json_serializer,
+    json_deserializer=orjson.loads,
 )
 
+@event.listens_for(engine, "connect")
+def _sqlite_pragmas(dbapi_con, _):
+    # WAL: skaitymai neblokuoja rašymo; NORMAL – fsync tik checkpoint'e, ne kiekvienam commit
+    cur = dbapi_con.cursor()
+    cur.execute("PRAGMA journal_mode=WAL")
+    cur.execute("PRAGMA synchronous=NORMAL")
+    cur.execute("PRAGMA temp_store=MEMORY")
+    cur.execute("PRAGMA mmap_size=268435456")
+    cur.execute("PRAGMA cache_size=-64000")
+    cur.close()
+
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 def get_db():
     """FastAPI dependency: grąžina DB sesiją ir ją uždaro po užklausos."""
@@ -16,11 +45,54 @@ def get_db():
     finally:
         db.close()
 
-        
+
+# atsakymo meta stulpeliai, perkelti iš buvusios message_responses lentelės į chat_messages
+_CHAT_MESSAGE_META_COLUMNS = (
+    ("response_time_ms", "INTEGER"),
+    ("source_layer", "VARCHAR(7)"),
+    ("source_qa_id", "VARCHAR REFERENCES qa_pairs (qa_id)"),
+    ("source_document_chunks", "JSON"),
+)
+
+def _migrate_chat_messages(conn, existing: set) -> None:
+    # senoms DB: create_all stulpelių neprideda – ALTER TABLE + vienkartinis meta perkėlimas
+    if "chat_messages" not in existing:
+        return
+    columns = {row[1] for row in conn.execute(text("PRAGMA table_info(chat_messages)"))}
+    missing = [(name, ddl) for name, ddl in _CHAT_MESSAGE_META_COLUMNS if name not in columns]
+    if not missing:
+        return
+    print("Migrating chat_messages: adding response meta columns...")
+    for name, ddl in missing:
+        conn.execute(text(f"ALTER TABLE chat_messages ADD COLUMN {name} {ddl}"))
+    if "message_responses" in existing:
+        # senoji lentelė paliekama (nebenaudojama) – galima ištrinti ranka
+        conn.execute(text(
+            "UPDATE chat_messages SET (response_time_ms, source_layer, source_qa_id, source_document_chunks) = "
+            "(SELECT r.response_time_ms, r.source_layer, r.source_qa_id, r.source_document_chunks "
+            " FROM message_responses r WHERE r.message_id = chat_messages.id) "
+            "WHERE id IN (SELECT message_id FROM message_responses)"
+        ))
+
 def init_db():
     from app.db.base import Base
     from app.db import models
     
     print("Initializing database...")
+    # viena užklausa į sqlite_master: jei visos lentelės ir indeksai jau yra – nieko nedarom
+    # (create_all / checkfirst kiekvienai lentelei ir indeksui darytų atskirą PRAGMA)
+    with engine.connect() as conn:
+        existing = set(conn.execute(text("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")).scalars())
+    expected = {table.name for table in Base.metadata.sorted_tables}
+    expected.update(index.name for table in Base.metadata.sorted_tables for index in table.indexes)
+    if expected <= existing:
+        print("Database schema up to date.")
+        return
+    with engine.begin() as conn:
+        _migrate_chat_messages(conn, existing)
     Base.metadata.create_all(bind=engine)
+    # create_all neprideda naujų indeksų prie jau esamų lentelių
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
     print("Database initialization complete.")
\ No newline at end of file
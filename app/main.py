@@ -1,35 +1,97 @@
+import asyncio
+import os
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from sqlalchemy.orm import Session
-from fastapi.staticfiles import StaticFiles
+from sqlalchemy import func, select
+from sqlalchemy.orm import Session, selectinload
 
 from app.api.routes import router as api_router
 from app.api.pages import router as pages_router
-from app.db import init_db, SessionLocal, QAPair
-from app.services.semantic_search import SemanticSearchService, search_service as global_search_service
+from app.core.config import settings
+from app.db import init_db, SessionLocal, QAPair, QuestionVariation
 from app.api.chat_routes import router as chat_router
 from app.api.qa_doc_routes import router as qa_doc_router
+from app.services.open_ai import close_client as close_openai_client
+from app.utils.static_files import CachedStaticFiles
+
+try:
+    import fcntl  # POSIX; Windows'e užrakto nėra (ten vis tiek vienas worker'is)
+except ImportError:
+    fcntl = None
+
+_CACHE_DIR = "./.cache"
+
+def _expected_index_entries(db: Session) -> int:
+    # tiek įrašų sukuria sync_index_from_db: klausimas (jei yra) + kiekviena variacija
+    questions = db.execute(
+        select(func.count()).select_from(QAPair).where(QAPair.question_lt != "")
+    ).scalar_one()
+    variations = db.execute(
+        select(func.count(QuestionVariation.id))
+        .join(QAPair, QuestionVariation.qa_pair_id == QAPair.qa_id)
+    ).scalar_one()
+    return questions + variations
+
+def _sync_qa_index(search_service) -> None:
+    db: Session = SessionLocal()
+    try:
+        # įrašų skaičius nepastebi pakeisto modelio / backend'o (EMBED_BACKEND, kvantizacija) –
+        # tada seni vektoriai nesulyginami su naujo modelio užklausomis, todėl tikrinama ir žymė
+        if not search_service.qa_index_is_current():
+            print(f"Q&A index was built with another embedding model/backend – re-syncing ({search_service.embedding_tag}).")
+        elif search_service.qa_collection.count() == _expected_index_entries(db):
+            print("Q&A index already in sync with DB – skipping startup sync.")
+            return
+        # srautu po 1000 porų (variacijos – viena selectinload užklausa kiekvienam batch'ui)
+        stmt = (
+            select(QAPair)
+            .options(selectinload(QAPair.variations))
+            .execution_options(yield_per=1000)
+        )
+        search_service.sync_index_from_db(db.execute(stmt).scalars().partitions())
+    finally:
+        db.close()
+
+async def _keep_index_warm(search_service, interval: float) -> None:
+    while True:
+        await asyncio.sleep(interval)
+        await asyncio.to_thread(search_service.warm_up)
+
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     print("--- Application Startup ---")
     init_db()
-    global global_search_service
-    if global_search_service is None:
-        print("Instantiating and syncing SemanticSearchService...")
-        global_search_service = SemanticSearchService()
-        db: Session = SessionLocal()
+    print("Instantiating and syncing SemanticSearchService...")
+    # importuojama čia, ne modulio viršuje – torch / transformers kraunami tik paleidžiant
+    from app.services.semantic_search import get_service
+    # get_service() kešuoja instanciją – visi routeriai naudos tą pačią
+    search_service = get_service()
+    # keli uvicorn worker'iai: sinchronizuoja tik pirmasis užėmęs užraktą,
+    # kiti sulaukia jo pabaigos ir, sutapus įrašų skaičiui, sync praleidžia
+    os.makedirs(_CACHE_DIR, exist_ok=True)
+    with open(os.path.join(_CACHE_DIR, "qa_index_sync.lock"), "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
         try:
-            all_qa_pairs = db.query(QAPair).all()
-            if all_qa_pairs:
-                global_search_service.sync_index_from_db(all_qa_pairs)
-            else:
-                print("No Q&A pairs in DB to sync with ChromaDB.")
+            _sync_qa_index(search_service)
         finally:
-            db.close()
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+    # pirmoji tikra užklausa nemoka už modelio ir HNSW failų įkėlimą
+    search_service.warm_up()
+    keep_warm = None
+    if settings.INDEX_KEEP_WARM_SECONDS > 0:
+        keep_warm = asyncio.create_task(_keep_index_warm(search_service, settings.INDEX_KEEP_WARM_SECONDS))
     print("--- Startup Complete ---")
     yield
     print("--- Application Shutdown ---")
+    if keep_warm is not None:
+        keep_warm.cancel()
+    # eilėje likusios variacijos suindeksuojamos prieš išjungiant
+    search_service.flush_variations()
+    # uždaromas bendras OpenAI HTTP connection pool'as
+    await close_openai_client()
 
 app = FastAPI(
     title="Simple LLM API",
@@ -58,11 +120,20 @@ API atsakyti į klausimus naudojant OpenAI modelius.
 
 app.add_middleware(
     CORSMiddleware,
-    allow_origins=["*"], allow_credentials=True,
-    allow_methods=["*"], allow_headers=["*"],
+    allow_origins=settings.CORS_ALLOW_ORIGINS, allow_credentials=True,
+    allow_methods=["GET", "POST", "PUT", "DELETE"],
+    allow_headers=["Authorization", "Content-Type"],
+    # sąrašų kursorius grąžinamas antraštėje – kitaip JS iš kito origin'o jo nematytų
+    expose_headers=["X-Next-Cursor"],
+    max_age=settings.CORS_MAX_AGE,
 )
 
 
+app.mount(
+    "/static",
+    CachedStaticFiles(directory="app/static", max_age=settings.STATIC_MAX_AGE),
+    name="static",
+)
 app.include_router(pages_router)
 app.include_router(api_router, prefix="/api")
 app.include_router(chat_router, prefix="/api/chat")
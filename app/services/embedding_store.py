@@ -0,0 +1,137 @@
+import json
+import os
+import threading
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+
+try:
+    import fcntl  # POSIX; on Windows the app runs a single worker anyway
+except ImportError:
+    fcntl = None
+
+
+class Fp16EmbeddingStore:
+    """
+    Append-only on-disk embedding matrix: one contiguous float16 row per text in a
+    memory-mapped .npy file, plus a text -> row index kept in a side file (one JSON
+    string per line, line number == row). Capacity grows by doubling.
+
+    Several worker processes may share the files: appends and growth happen under an
+    exclusive file lock, after picking up the rows other processes appended meanwhile.
+    Rows are never rewritten once their key is published, so reads need no file lock.
+    """
+
+    def __init__(self, path_prefix: str, initial_capacity: int = 1024):
+        self._npy_path = f"{path_prefix}.npy"
+        self._keys_path = f"{path_prefix}.keys.jsonl"
+        self._lock_path = f"{path_prefix}.lock"
+        self._initial_capacity = initial_capacity
+        self._lock = threading.Lock()
+        self._row_of: Dict[str, int] = {}
+        self._matrix: Optional[np.memmap] = None
+        self._matrix_ino: Optional[int] = None
+        self._size = 0
+        # byte offset in the keys file up to which lines have been read
+        self._keys_offset = 0
+        os.makedirs(os.path.dirname(self._npy_path) or ".", exist_ok=True)
+        with self._lock, self._file_lock():
+            self._refresh()
+
+    def __len__(self) -> int:
+        return self._size
+
+    @contextmanager
+    def _file_lock(self):
+        with open(self._lock_path, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def _refresh(self):
+        """Under both locks: remap the matrix if another process grew it, read newly appended keys."""
+        try:
+            ino = os.stat(self._npy_path).st_ino
+        except FileNotFoundError:
+            return
+        if ino != self._matrix_ino:
+            try:
+                self._matrix = np.lib.format.open_memmap(self._npy_path, mode="r+")
+            except (ValueError, OSError) as e:
+                print(f"Ignoring unreadable embedding store {self._npy_path}: {e}")
+                self._matrix, self._matrix_ino = None, None
+                return
+            self._matrix_ino = ino
+        if not os.path.exists(self._keys_path):
+            return
+        with open(self._keys_path, "rb+") as f:
+            f.seek(self._keys_offset)
+            data = f.read()
+            complete = data.rfind(b"\n") + 1
+            if complete < len(data):
+                # torn last line from a crash mid-append: drop it so the next append starts on a fresh line
+                f.truncate(self._keys_offset + complete)
+        for line in data[:complete].splitlines():
+            # rows are written before their key, so a key never points past the written rows
+            if self._size >= len(self._matrix):
+                break
+            self._row_of[json.loads(line)] = self._size
+            self._size += 1
+        self._keys_offset += complete
+
+    def get_many(self, texts: Iterable[str]) -> Dict[str, np.ndarray]:
+        """float32 rows for the texts already stored; unknown texts are simply absent."""
+        with self._lock:
+            rows = {text: self._row_of[text] for text in texts if text in self._row_of}
+            if not rows:
+                return {}
+            # one fancy-index gather over contiguous rows, then a single fp16 -> fp32 cast
+            block = self._matrix[list(rows.values())].astype(np.float32)
+        return dict(zip(rows.keys(), block))
+
+    def add_many(self, texts: List[str], vectors: np.ndarray):
+        with self._lock, self._file_lock():
+            # other workers may have appended (or grown the file) since our last look
+            self._refresh()
+            first_index: Dict[str, int] = {}
+            for i, text in enumerate(texts):
+                if text not in self._row_of:
+                    first_index.setdefault(text, i)
+            new = list(first_index.items())
+            if not new:
+                return
+            start = self._size
+            self._reserve(start + len(new), vectors.shape[1])
+            self._matrix[start:start + len(new)] = vectors[[i for _, i in new]].astype(np.float16)
+            self._matrix.flush()
+            encoded = "".join(json.dumps(text, ensure_ascii=False) + "\n" for text, _ in new).encode("utf-8")
+            with open(self._keys_path, "ab") as f:
+                f.write(encoded)
+            self._keys_offset += len(encoded)
+            for offset, (text, _) in enumerate(new):
+                self._row_of[text] = start + offset
+            self._size += len(new)
+
+    def _reserve(self, needed: int, dim: int):
+        if self._matrix is not None and needed <= len(self._matrix):
+            return
+        capacity = max(self._initial_capacity, len(self._matrix) if self._matrix is not None else 0)
+        while capacity < needed:
+            capacity *= 2
+        tmp_path = f"{self._npy_path}.tmp"
+        grown = np.lib.format.open_memmap(tmp_path, mode="w+", dtype=np.float16, shape=(capacity, dim))
+        if self._matrix is not None:
+            grown[:self._size] = self._matrix[:self._size]
+        grown.flush()
+        # drop both mappings before the rename (required on Windows); other processes keep
+        # reading their old mapping, which still holds every row they know, until their next refresh
+        del grown
+        self._matrix = None
+        os.replace(tmp_path, self._npy_path)
+        self._matrix = np.lib.format.open_memmap(self._npy_path, mode="r+")
+        self._matrix_ino = os.stat(self._npy_path).st_ino
@@ -1,13 +1,42 @@
 from typing import List, Dict, Optional, AsyncGenerator
+import httpx
 from openai import AsyncOpenAI, APIError, APIConnectionError, RateLimitError
 from app.core.config import settings
 
-client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY)
+try:
+    import h2  # noqa: F401  (httpx[http2])
+    _HTTP2 = True
+except ImportError:
+    _HTTP2 = False
+
+# one shared connection pool: concurrent calls reuse kept-alive TLS connections
+# (multiplexed over HTTP/2 when h2 is installed) instead of opening new ones
+_http = httpx.AsyncClient(
+    http2=_HTTP2,
+    limits=httpx.Limits(
+        max_connections=settings.OPENAI_MAX_CONNECTIONS,
+        max_keepalive_connections=settings.OPENAI_MAX_KEEPALIVE_CONNECTIONS,
+    ),
+    timeout=settings.OPENAI_TIMEOUT_SECONDS,
+)
+client = AsyncOpenAI(api_key=settings.OPENAI_API_KEY, http_client=_http)
+
+
+async def close_client() -> None:
+    await client.close()
+
+
+class AIErrorText(str):
+    """Error message returned in place of a model answer: shown to the user, but never cached."""
+
+
+def is_ai_error(text: Optional[str]) -> bool:
+    return isinstance(text, AIErrorText)
 
 
 async def get_rag_response(query: str, context_chunks: List[str]) -> str:
     if not settings.OPENAI_API_KEY:
-        return "OpenAI API key is not configured."
+        return AIErrorText("OpenAI API key is not configured.")
     context = "\n---\n".join(context_chunks)
 
     system_prompt = f"""Įdėti kontekstą, ką daryti su turiniu ir kokios taisyklės
@@ -27,15 +56,15 @@ CONTEXT:
         )
         return (response.choices[0].message.content or "").strip()
     except (APIError, APIConnectionError, RateLimitError) as e:
-        return f"An error occurred while contacting the AI model: {e}"
+        return AIErrorText(f"An error occurred while contacting the AI model: {e}")
     except Exception as e:
-        return f"An unexpected error occurred: {e}"
+        return AIErrorText(f"An unexpected error occurred: {e}")
 
 async def stream_general_knowledge_response(
     query: str, history: Optional[List[Dict[str, str]]] = None
 ) -> AsyncGenerator[str, None]:
     if not settings.OPENAI_API_KEY:
-        yield "OpenAI API key is not configured. Please check your environment variables."
+        yield AIErrorText("OpenAI API key is not configured. Please check your environment variables.")
         return
 
     system_prompt = """Other context for full answer"""
@@ -60,14 +89,14 @@ async def stream_general_knowledge_response(
             if content:
                 yield content
     except (APIError, APIConnectionError, RateLimitError) as e:
-        yield f"An error occurred while contacting the AI model: {e}"
+        yield AIErrorText(f"An error occurred while contacting the AI model: {e}")
     except Exception as e:
-        yield f"An unexpected error occurred: {e}"
+        yield AIErrorText(f"An unexpected error occurred: {e}")
 
 async def get_general_knowledge_response(
     query: str, history: Optional[List[Dict[str, str]]] = None
 ) -> str:
-    full_response = ""
-    async for chunk in stream_general_knowledge_response(query, history):
-        full_response += chunk
-    return full_response
+    chunks = [chunk async for chunk in stream_general_knowledge_response(query, history)]
+    answer = "".join(chunks)
+    # a stream that ended in an error is an error as a whole, even if some text came before it
+    return AIErrorText(answer) if any(is_ai_error(chunk) for chunk in chunks) else answer
@@ -0,0 +1,84 @@
+import hashlib
+import time
+import uuid
+from functools import lru_cache
+from typing import List, Optional
+
+from app.core.config import settings
+from app.services.open_ai import is_ai_error
+from app.services.semantic_search import get_service
+
+
+class SemanticAnswerCache:
+    """
+    LLM answer cache keyed by question meaning: a new question whose embedding is
+    within SEMANTIC_CACHE_MAX_DISTANCE (cosine) of an already answered one gets
+    the stored answer instead of another OpenAI call. Entries expire after
+    SEMANTIC_CACHE_TTL_SECONDS; above SEMANTIC_CACHE_MAX_ENTRIES the oldest are evicted.
+    """
+
+    def __init__(self):
+        self.svc = get_service()
+        # separate collection so cached answers never show up in Q&A / document search
+        self.collection = self.svc.client.get_or_create_collection(
+            name="anita_answer_cache", metadata={"hnsw:space": "cosine"}
+        )
+
+    @staticmethod
+    def _scope(kind: str, context: Optional[List[str]] = None) -> str:
+        # RAG answers are only reusable for exactly the same context
+        if not context:
+            return kind
+        return f"{kind}:{hashlib.sha1(chr(31).join(context).encode('utf-8')).hexdigest()}"
+
+    def lookup(self, message: str, kind: str, context: Optional[List[str]] = None) -> Optional[str]:
+        results = self.collection.query(
+            query_embeddings=[self.svc.embed_query(message)],
+            n_results=1,
+            where={"$and": [
+                {"scope": self._scope(kind, context)},
+                {"created_at": {"$gte": time.time() - settings.SEMANTIC_CACHE_TTL_SECONDS}},
+            ]},
+        )
+        if not results or not results["ids"] or not results["ids"][0]:
+            return None
+        distance = results["distances"][0][0]
+        if distance > settings.SEMANTIC_CACHE_MAX_DISTANCE:
+            return None
+        print(f"Semantic cache hit ({kind}, distance {distance:.4f})")
+        return results["metadatas"][0][0]["answer"]
+
+    def store(self, message: str, answer: str, kind: str, context: Optional[List[str]] = None):
+        # error messages stand in for an answer only for the failed request itself
+        if not answer or is_ai_error(answer):
+            return
+        self.collection.add(
+            ids=[str(uuid.uuid4())],
+            embeddings=[self.svc.embed_query(message)],
+            metadatas=[{
+                "scope": self._scope(kind, context), "question": message, "answer": answer,
+                "created_at": time.time(),
+            }],
+        )
+        self._evict()
+
+    def _evict(self):
+        max_entries = settings.SEMANTIC_CACHE_MAX_ENTRIES
+        if self.collection.count() <= max_entries:
+            return
+        # expired entries first (also drops entries from before created_at was stored)
+        cutoff = time.time() - settings.SEMANTIC_CACHE_TTL_SECONDS
+        self.collection.delete(where={"created_at": {"$lt": cutoff}})
+        overflow = self.collection.count() - max_entries
+        if overflow <= 0:
+            return
+        # still full: drop the oldest, down to 90% so this does not run on every store
+        entries = self.collection.get(include=["metadatas"])
+        by_age = sorted(zip(entries["ids"], entries["metadatas"]), key=lambda e: (e[1] or {}).get("created_at", 0))
+        excess = overflow + max_entries // 10
+        self.collection.delete(ids=[entry_id for entry_id, _ in by_age[:excess]])
+
+
+@lru_cache(maxsize=1)
+def get_answer_cache() -> SemanticAnswerCache:
+    return SemanticAnswerCache()
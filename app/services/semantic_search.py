@@ -1,48 +1,351 @@
-import chromadb
-from sentence_transformers import SentenceTransformer, util
-from typing import Optional, Dict, Any, List
+import asyncio
+import hashlib
+import httpx
+import numpy as np
+import os
+import queue
+from typing import Optional, Dict, Any, List, AsyncIterator, Iterable, Tuple
+from app.core.config import settings
 from app.db.models import QAPair, QuestionVariation
+from app.services.embedding_store import Fp16EmbeddingStore
 import re
-import torch
-import uuid
-# Global variable to store the service instance
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import closing
+from functools import lru_cache
+
+
+_MISS = object()
+_STOP = object()
+
+_STOP_WORDS = frozenset({
+    'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has',
+    'he', 'in', 'is', 'it', 'its', 'of', 'on', 'that', 'the', 'to', 'was',
+    'were', 'will', 'with', 'what', 'when', 'where', 'who', 'whom', 'why',
+    'how'
+})
+# same character class as before: drops punctuation (incl. non-ASCII quotes/dashes), keeps letters, digits, "_"
+_NON_WORD_RE = re.compile(r'[^\w\s]+')
+
+
+def _prefetch(iterable: Iterable, depth: int):
+    """
+    Iterate `iterable` in a background thread, keeping up to `depth` items ready ahead of
+    the consumer. Producer exceptions are re-raised in the consumer.
+    """
+    items: "queue.Queue[Any]" = queue.Queue(maxsize=max(1, depth))
+    done = threading.Event()
+
+    def _put(item) -> bool:
+        while not done.is_set():
+            try:
+                items.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def _produce():
+        try:
+            for item in iterable:
+                if not _put((True, item)):
+                    return
+        except BaseException as e:
+            _put((False, e))
+            return
+        _put(_STOP)
+
+    producer = threading.Thread(target=_produce, name="prefetch", daemon=True)
+    producer.start()
+    try:
+        while True:
+            item = items.get()
+            if item is _STOP:
+                return
+            ok, value = item
+            if not ok:
+                raise value
+            yield value
+    finally:
+        # consumer finished or failed: let the producer exit instead of blocking on a full queue
+        done.set()
+        producer.join()
+
+
+class _TTLCache:
+    """Small thread-safe LRU whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        # bumped on clear(), so a lookup that started before an index change cannot store a stale result
+        self.generation = 0
+
+    def get(self, key, default=_MISS):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            expires, value = item
+            if expires < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value, generation: int):
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.generation += 1
+
+
+EMBEDDING_MODEL_NAME = 'paraphrase-multilingual-mpnet-base-v2'
+# cosine space: Chroma's distance for a document chunk is 1 - cos_sim(query, chunk) directly
+DOCUMENT_COLLECTION_METADATA = {
+    "hnsw:space": "cosine",
+    "hnsw:M": 32,
+    "hnsw:construction_ef": 200,
+    "hnsw:search_ef": 64,
+}
+
+
+def _load_embedding_model():
+    """
+    Load the embedding model on the configured backend. For "onnx" / "openvino" the exported
+    model is saved under EMBED_MODEL_CACHE_DIR on first start and loaded from there afterwards;
+    with EMBED_ONNX_QUANTIZATION set, a dynamically quantized INT8 copy is exported next to it.
+    """
+    from sentence_transformers import SentenceTransformer
+
+    backend = settings.EMBED_BACKEND
+    if backend == "torch":
+        if settings.EMBED_TORCH_THREADS:
+            import torch
+            torch.set_num_threads(settings.EMBED_TORCH_THREADS)
+        return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+    local_dir = os.path.join(settings.EMBED_MODEL_CACHE_DIR, f"{EMBEDDING_MODEL_NAME}-{backend}")
+    model = None
+    if not os.path.isdir(local_dir):
+        print(f"Exporting embedding model to {backend} (first start only)...")
+        model = SentenceTransformer(EMBEDDING_MODEL_NAME, backend=backend)
+        model.save_pretrained(local_dir)
+
+    quantization = settings.EMBED_ONNX_QUANTIZATION if backend == "onnx" else None
+    if not quantization:
+        if model is None:
+            print(f"Loading {backend} embedding model from {local_dir}")
+            model = SentenceTransformer(local_dir, backend=backend)
+        return model
+
+    # e.g. "avx512_vnni" -> onnx/model_qint8_avx512_vnni.onnx (int8 MatMul weights)
+    file_name = f"onnx/model_qint8_{quantization}.onnx"
+    if not os.path.exists(os.path.join(local_dir, file_name)):
+        from sentence_transformers import export_dynamic_quantized_onnx_model
+
+        print(f"Quantizing ONNX embedding model ({quantization}, first start only)...")
+        if model is None:
+            model = SentenceTransformer(local_dir, backend=backend)
+        export_dynamic_quantized_onnx_model(model, quantization, local_dir)
+    print(f"Loading INT8 ONNX embedding model from {local_dir}/{file_name}")
+    return SentenceTransformer(local_dir, backend=backend, model_kwargs={"file_name": file_name})
+
+
+def _cosine_scores(query_vec: np.ndarray, candidate_vecs: np.ndarray) -> np.ndarray:
+    """Cosine similarity of one query vector against each row of candidate_vecs."""
+    norms = np.linalg.norm(candidate_vecs, axis=1) * np.linalg.norm(query_vec)
+    return (candidate_vecs @ query_vec) / np.maximum(norms, 1e-12)
+
+
+def _unit_rows(vecs: np.ndarray) -> np.ndarray:
+    """L2-normalize each row, so cosine similarity against them is a plain dot product."""
+    return vecs / np.maximum(np.linalg.norm(vecs, axis=-1, keepdims=True), 1e-12)
 
 
 class SemanticSearchService:
     def __init__(self):
         print("Initializing SemanticSearchService with Two-Phase Search...")
-        self.model = SentenceTransformer('paraphrase-multilingual-mpnet-base-v2')
+        # heavy imports (torch, transformers, chromadb) happen here, not when the module is imported
+        import chromadb
+
+        self.model = _load_embedding_model()
         self.client = chromadb.PersistentClient(path="./chroma_db")
         self.qa_collection = self.client.get_or_create_collection(name="anita_qa_pairs")
-        self.document_collection = self.client.get_or_create_collection(name="anita_documents")
+        self.document_collection, self._documents_cosine = self._open_document_collection()
+        self._embed_http: Optional[httpx.AsyncClient] = None
+        # single variations are embedded in micro-batches by a background thread
+        self._variation_queue: "queue.Queue[Any]" = queue.Queue()
+        self._variation_lock = threading.Lock()
+        self._variation_worker: Optional[threading.Thread] = None
+        # repeated questions skip the embed + ANN + re-rank round; cleared whenever the Q&A index changes,
+        # in this worker directly and in the others through the shared version stamp file
+        self._match_cache = _TTLCache(settings.MATCH_CACHE_SIZE, settings.MATCH_CACHE_TTL_SECONDS)
+        self._index_version_path = settings.QA_INDEX_VERSION_FILE
+        self._seen_index_version = self._read_index_version()
+        # query embeddings are deterministic for a given model, so this one never needs invalidation
+        self._query_embed_cache = _TTLCache(settings.QUERY_EMBED_CACHE_SIZE, settings.QUERY_EMBED_CACHE_TTL_SECONDS)
+        # afind_best_match: language -> [(query, future)] waiting for the next coalesced batch
+        self._match_batches: Dict[str, List[Tuple[str, "asyncio.Future"]]] = {}
+        self._match_batch_tasks: set = set()
+        self._match_batch_timers: Dict[str, asyncio.TimerHandle] = {}
+        self._warmup_embedding: Optional[List[float]] = None
+        # raw-text embeddings of re-rank candidates (unit length), persisted across restarts; keyed by text,
+        # so edited questions just get a new row and never read a stale one. One file set per model/backend.
+        self._rerank_store = Fp16EmbeddingStore(os.path.join(settings.RERANK_STORE_DIR, f"{self.embedding_tag}-unit"))
+
+    @property
+    def embedding_tag(self) -> str:
+        """Model + backend (+ quantization): vectors from different tags are not comparable."""
+        return "-".join(filter(None, [EMBEDDING_MODEL_NAME, settings.EMBED_BACKEND, settings.EMBED_ONNX_QUANTIZATION]))
+
+    def qa_index_is_current(self) -> bool:
+        """True if the Q&A collection was last fully synced with the current embedding model/backend."""
+        return (self.qa_collection.metadata or {}).get("embedding_tag") == self.embedding_tag
+
+    def _open_document_collection(self):
+        """
+        (collection, is_cosine). The HNSW space is fixed when a collection is created, so the metadata
+        is only passed on creation: get_or_create_collection(metadata=...) may overwrite the stored
+        metadata of an existing L2 collection in some Chroma versions while its index stays L2.
+        Collections from before DOCUMENT_COLLECTION_METADATA keep the re-encode scoring path.
+        """
+        name = "anita_documents"
+        try:
+            collection = self.client.get_collection(name=name)
+        except Exception:
+            # not found (the exception type differs between Chroma versions)
+            try:
+                collection = self.client.create_collection(name=name, metadata=DOCUMENT_COLLECTION_METADATA)
+            except Exception:
+                # another worker created it in the meantime
+                collection = self.client.get_collection(name=name)
+        return collection, (collection.metadata or {}).get("hnsw:space") == "cosine"
 
     def _get_stripped_text(self, text: str) -> str:
-        stop_words = {
-            'a', 'an', 'and', 'are', 'as', 'at', 'be', 'by', 'for', 'from', 'has', 
-            'he', 'in', 'is', 'it', 'its', 'of', 'on', 'that', 'the', 'to', 'was', 
-            'were', 'will', 'with', 'what', 'when', 'where', 'who', 'whom', 'why',
-            'how'
+        # split() also collapses whitespace and trims, so no separate whitespace regex is needed
+        return " ".join([word for word in _NON_WORD_RE.sub('', text.lower()).split() if word not in _STOP_WORDS])
+
+    def _vectorize(self, text: str or List[str], batch_size: int = 32):
+        return self.model.encode(text, convert_to_tensor=True, batch_size=batch_size, show_progress_bar=False)
+
+    def _vectorize_np(self, text, batch_size: int = 32) -> np.ndarray:
+        # float32 arrays on the CPU: scoring a handful of candidates is a plain numpy dot
+        return self.model.encode(text, convert_to_numpy=True, batch_size=batch_size, show_progress_bar=False)
+
+    def _vectorize_query(self, text: str):
+        """Single-query encode behind an LRU/TTL cache keyed by the exact text sent to the model."""
+        cache = self._query_embed_cache
+        cached = cache.get(text)
+        if cached is not _MISS:
+            return cached
+        generation = cache.generation
+        embedding = self._vectorize_np(text)
+        cache.set(text, embedding, generation)
+        return embedding
+
+    def _rerank_vectors(self, query: str, candidate_texts: List[str]) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Phase 2 inputs: the query embedding (in-memory cache) and the unit-length candidate
+        embeddings (persistent fp16 store). Whatever is missing goes to the model in one encode.
+        """
+        cache = self._query_embed_cache
+        generation = cache.generation
+        query_vec = cache.get(query)
+        stored = self._rerank_store.get_many(candidate_texts)
+        missing = list(dict.fromkeys(text for text in candidate_texts if text not in stored))
+        to_encode = list(dict.fromkeys(([query] if query_vec is _MISS else []) + missing))
+        if to_encode:
+            fresh = dict(zip(to_encode, self._vectorize_np(to_encode)))
+            if query_vec is _MISS:
+                query_vec = fresh[query]
+                cache.set(query, query_vec, generation)
+            if missing:
+                # normalized once here instead of on every re-rank
+                new_vecs = _unit_rows(np.stack([fresh[text] for text in missing]))
+                self._rerank_store.add_many(missing, new_vecs)
+                stored.update(zip(missing, new_vecs))
+        return query_vec, np.stack([stored[text] for text in candidate_texts])
+
+    def warm_up(self):
+        """
+        Throwaway encode + one query per collection, so the first real request does not pay for
+        the model's first forward pass or for paging the HNSW index files in from disk.
+        """
+        if self._warmup_embedding is None:
+            self._warmup_embedding = self._vectorize_np("warm up").tolist()
+        for collection in (self.qa_collection, self.document_collection):
+            try:
+                if collection.count():
+                    collection.query(query_embeddings=[self._warmup_embedding], n_results=1, include=["distances"])
+            except Exception as e:
+                print(f"Warm-up query on '{collection.name}' failed: {e}")
+
+    def cache_stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            "query_embeddings": {"hits": self._query_embed_cache.hits, "misses": self._query_embed_cache.misses},
+            "matches": {"hits": self._match_cache.hits, "misses": self._match_cache.misses},
+            "rerank_store": {"rows": len(self._rerank_store)},
         }
-        
-        text = text.lower()
-        text = re.sub(r'[^\w\s]', '', text)
-        words = text.split()
-        filtered_words = [word for word in words if word not in stop_words]
-        text = " ".join(filtered_words)
-        text = re.sub(r'\s+', ' ', text).strip()
-        return text
-
-    def _vectorize(self, text: str or List[str]):
-        return self.model.encode(text, convert_to_tensor=True)
-
-    def sync_index_from_db(self, all_pairs: List[QAPair]):
-        print(f"Syncing {len(all_pairs)} pairs and their variations to ChromaDB...")
+
+    def sync_index_from_db(self, pair_batches: Iterable[List[QAPair]]):
+        """
+        Three-stage pipeline: a prefetch thread pulls the next DB batches and builds their index
+        entries, this thread runs the encoder, and a writer thread adds the previous batch to
+        Chroma - so DB reads and Chroma writes overlap with encoding instead of alternating.
+        """
+        print("Syncing QA pairs and their variations to ChromaDB...")
+        self._invalidate_matches()
         self.qa_collection.delete(where={"qa_id": {"$ne": "dummy_id_to_avoid_error_on_empty_db"}})
-        for qa_pair in all_pairs:
-            self.add_qa_pair(qa_pair)
-        print("Sync complete.")
+        total = 0
+        pending = None
+        prepared = _prefetch(self._prepare_sync_batches(pair_batches), settings.SYNC_PREFETCH_BATCHES)
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="qa-index-writer") as writer, closing(prepared):
+            for pair_count, entries, texts in prepared:
+                total += pair_count
+                if not entries:
+                    continue
+                print(f"Batch-indexing {len(entries)} questions for {pair_count} pairs...")
+                embeddings = self._vectorize(texts, batch_size=64).tolist()
+                if pending is not None:
+                    pending.result()
+                pending = writer.submit(
+                    self._add_to_qa_collection,
+                    [q['id'] for q in entries],
+                    embeddings,
+                    [q['meta'] for q in entries],
+                )
+            if pending is not None:
+                pending.result()
+        # recorded only after a complete sync, so an interrupted one is redone on the next start
+        self.qa_collection.modify(metadata={**(self.qa_collection.metadata or {}), "embedding_tag": self.embedding_tag})
+        print(f"Sync complete: {total} pairs.")
 
-    def add_qa_pair(self, qa_pair: QAPair):
+    def _prepare_sync_batches(self, pair_batches: Iterable[List[QAPair]]):
+        for batch in pair_batches:
+            entries = []
+            for qa_pair in batch:
+                entries.extend(self._qa_index_entries(qa_pair))
+            yield len(batch), entries, [self._get_stripped_text(q['text']) for q in entries]
+
+    def _qa_index_entries(self, qa_pair: QAPair) -> List[Dict[str, Any]]:
         questions_to_index = []
 
         if qa_pair.question_lt:
@@ -62,85 +365,350 @@ class SemanticSearchService:
                     "meta": {"qa_id": qa_pair.qa_id, "language": variation.language, "original_question": variation.variation_text}
                 })
 
+        return questions_to_index
+
+    def _add_index_entries(self, questions_to_index: List[Dict[str, Any]], upsert: bool = False):
         if not questions_to_index:
             return
 
         texts_to_vectorize = [self._get_stripped_text(q['text']) for q in questions_to_index]
-        embeddings = self._vectorize(texts_to_vectorize).tolist()
-        
-        self.qa_collection.add(
-            ids=[q['id'] for q in questions_to_index],
-            embeddings=embeddings,
-            metadatas=[q['meta'] for q in questions_to_index]
+        embeddings = self._vectorize(texts_to_vectorize, batch_size=64).tolist()
+
+        self._add_to_qa_collection(
+            [q['id'] for q in questions_to_index],
+            embeddings,
+            [q['meta'] for q in questions_to_index],
+            upsert=upsert,
         )
-    
-    def add_question_variation(self, variation: QuestionVariation):
-        print(f"Indexing new variation for qa_id: {variation.qa_pair_id}")
-        stripped_question = self._get_stripped_text(variation.variation_text)
-        self.qa_collection.add(
-            ids=f"var_{variation.id}",
-            embeddings=self._vectorize(stripped_question).tolist(),
-            metadatas={
-                "qa_id": variation.qa_pair_id, 
-                "language": variation.language, 
-                "original_question": variation.variation_text
-            }
+
+    def _add_to_qa_collection(
+        self, ids: List[str], embeddings: List[List[float]], metadatas: List[Dict[str, Any]], upsert: bool = False
+    ):
+        # Chroma rejects adds above its max batch size; a 1000-pair sync partition with variations can exceed it
+        write = self.qa_collection.upsert if upsert else self.qa_collection.add
+        step = max(1, settings.QA_INDEX_ADD_BATCH_SIZE)
+        for start in range(0, len(ids), step):
+            write(
+                ids=ids[start:start + step],
+                embeddings=embeddings[start:start + step],
+                metadatas=metadatas[start:start + step],
+            )
+        self._invalidate_matches()
+
+    def add_qa_pair(self, qa_pair: QAPair):
+        self._add_index_entries(self._qa_index_entries(qa_pair))
+
+    def add_qa_pairs_batch(self, qa_pairs: List[QAPair]):
+        """Index many QA pairs with a single encode + add call instead of one per pair."""
+        questions_to_index = []
+        for qa_pair in qa_pairs:
+            questions_to_index.extend(self._qa_index_entries(qa_pair))
+        print(f"Batch-indexing {len(questions_to_index)} questions for {len(qa_pairs)} pairs...")
+        self._add_index_entries(questions_to_index)
+
+    async def aadd_qa_pairs_batch(self, qa_pairs: List[QAPair], batch_size: int = 64):
+        if not settings.EMBED_SERVICE_URL:
+            # local model: one encode call already packs everything into batches
+            await asyncio.to_thread(self.add_qa_pairs_batch, qa_pairs)
+            return
+
+        questions_to_index = []
+        for qa_pair in qa_pairs:
+            questions_to_index.extend(self._qa_index_entries(qa_pair))
+        if not questions_to_index:
+            return
+
+        # similar lengths end up in the same batch -> less padding on the embedder side
+        entries = sorted(
+            ((self._get_stripped_text(q['text']), q) for q in questions_to_index),
+            key=lambda e: len(e[0]),
         )
+        texts = [text for text, _ in entries]
+        sem = asyncio.Semaphore(max(1, settings.EMBED_CONCURRENCY))
+
+        async def _embed(batch: List[str]) -> List[List[float]]:
+            async with sem:
+                return await self.aembed_texts(batch, batch_size)
+
+        print(f"Batch-indexing {len(texts)} questions for {len(qa_pairs)} pairs via embed service...")
+        results = await asyncio.gather(*(_embed(texts[i:i + batch_size]) for i in range(0, len(texts), batch_size)))
+        await asyncio.to_thread(
+            self._add_to_qa_collection,
+            [q['id'] for _, q in entries],
+            [e for batch in results for e in batch],
+            [q['meta'] for _, q in entries],
+        )
+
+    def add_question_variation(self, variation: QuestionVariation):
+        """Queue a variation for indexing; the batcher thread embeds queued variations together."""
+        print(f"Queueing new variation for qa_id: {variation.qa_pair_id}")
+        with self._variation_lock:
+            if self._variation_worker is None:
+                self._variation_worker = threading.Thread(
+                    target=self._variation_loop, name="variation-indexer", daemon=True
+                )
+                self._variation_worker.start()
+        self._variation_queue.put(variation)
+
+    def _variation_loop(self):
+        # first item blocks; then collect more for up to VARIATION_BATCH_WAIT_SECONDS / VARIATION_BATCH_SIZE
+        while True:
+            item = self._variation_queue.get()
+            if item is _STOP:
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + settings.VARIATION_BATCH_WAIT_SECONDS
+            while len(batch) < settings.VARIATION_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = self._variation_queue.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is _STOP:
+                    stop = True
+                    break
+                batch.append(item)
+            try:
+                print(f"Indexing {len(batch)} queued variation(s) in one batch...")
+                self._add_index_entries([
+                    {
+                        "id": f"var_{variation.id}",
+                        "text": variation.variation_text,
+                        "meta": {
+                            "qa_id": variation.qa_pair_id,
+                            "language": variation.language,
+                            "original_question": variation.variation_text
+                        }
+                    }
+                    for variation in batch
+                ])
+            except Exception as e:
+                print(f"Variation batch indexing failed: {e}")
+            if stop:
+                return
+
+    def flush_variations(self):
+        """Index whatever is still queued and stop the batcher thread (called on shutdown)."""
+        with self._variation_lock:
+            worker, self._variation_worker = self._variation_worker, None
+        if worker is not None:
+            self._variation_queue.put(_STOP)
+            worker.join()
 
     def update_qa_pair(self, qa_pair: QAPair):
-        self.delete_qa_pair(qa_pair.qa_id)
-        self.add_qa_pair(qa_pair)
+        self.update_qa_pairs_batch([qa_pair])
+
+    def update_qa_pairs_batch(self, qa_pairs: List[QAPair]):
+        """
+        Re-index pairs in place: current entries are upserted (ids are stable per question /
+        variation), then only the ids that no longer exist are deleted - the pair never
+        disappears from the index in between.
+        """
+        if not qa_pairs:
+            return
+        existing = self.qa_collection.get(
+            where={"qa_id": {"$in": [qa_pair.qa_id for qa_pair in qa_pairs]}}, include=[]
+        )["ids"]
+        questions_to_index = []
+        for qa_pair in qa_pairs:
+            questions_to_index.extend(self._qa_index_entries(qa_pair))
+        print(f"Re-indexing {len(questions_to_index)} questions for {len(qa_pairs)} pairs...")
+        self._add_index_entries(questions_to_index, upsert=True)
+        stale = set(existing).difference(q['id'] for q in questions_to_index)
+        if stale:
+            self.qa_collection.delete(ids=list(stale))
+        self._invalidate_matches()
 
     def delete_qa_pair(self, qa_id: str):
         self.qa_collection.delete(where={"qa_id": qa_id})
+        self._invalidate_matches()
 
     def find_best_match(self, query: str, language: str) -> Optional[Dict[str, Any]]:
+        return self.find_best_match_batch([query], language)[0]
+
+    def _read_index_version(self) -> Optional[str]:
+        try:
+            with open(self._index_version_path, encoding="utf-8") as f:
+                return f.read()
+        except OSError:
+            return None
+
+    def _invalidate_matches(self):
+        """Drop cached matches here and bump the shared stamp, so the other workers drop theirs too."""
+        self._match_cache.clear()
+        stamp = f"{os.getpid()}-{time.time_ns()}"
+        try:
+            os.makedirs(os.path.dirname(self._index_version_path) or ".", exist_ok=True)
+            tmp_path = f"{self._index_version_path}.{os.getpid()}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                f.write(stamp)
+            os.replace(tmp_path, self._index_version_path)
+            self._seen_index_version = stamp
+        except OSError as e:
+            print(f"Could not update the Q&A index version stamp: {e}")
+
+    def _sync_index_version(self):
+        # another worker changed the Q&A index since we last looked: our cached matches may be stale
+        version = self._read_index_version()
+        if version != self._seen_index_version:
+            self._match_cache.clear()
+            self._seen_index_version = version
+
+    def find_best_match_batch(self, queries: List[str], language: str) -> List[Optional[Dict[str, Any]]]:
+        """
+        Match several queries of one language: cache hits are answered directly, the rest share
+        one encode call and one Chroma query, then each is re-ranked on its own.
+        """
+        self._sync_index_version()
+        generation = self._match_cache.generation
+        matches: List[Any] = []
+        pending: Dict[Tuple[str, str], List[int]] = {}
+        for i, query in enumerate(queries):
+            key = (" ".join(query.lower().split()), language)
+            cached = self._match_cache.get(key)
+            if cached is not _MISS:
+                print(f"Match cache hit ({language}) for: '{query}'")
+            else:
+                # the same question twice in one batch is searched once
+                pending.setdefault(key, []).append(i)
+            matches.append(cached)
+        if pending:
+            todo = [queries[indexes[0]] for indexes in pending.values()]
+            found = self._find_best_matches_uncached(todo, language)
+            # an index change in another worker during the search bumps the generation, so set() skips
+            self._sync_index_version()
+            for (key, indexes), match in zip(pending.items(), found):
+                self._match_cache.set(key, match, generation)
+                for i in indexes:
+                    matches[i] = match
+        return matches
+
+    async def afind_best_match(self, query: str, language: str) -> Optional[Dict[str, Any]]:
+        """
+        find_best_match for async callers: requests arriving within MATCH_BATCH_WAIT_SECONDS
+        for the same language are coalesced into one find_best_match_batch call.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        batch = self._match_batches.get(language)
+        if batch is None:
+            batch = self._match_batches[language] = []
+            self._match_batch_timers[language] = loop.call_later(
+                settings.MATCH_BATCH_WAIT_SECONDS, self._dispatch_match_batch, language
+            )
+        batch.append((query, future))
+        if len(batch) >= settings.MATCH_BATCH_SIZE:
+            self._dispatch_match_batch(language)
+        return await future
+
+    def _dispatch_match_batch(self, language: str):
+        # runs on the event loop: either the wait timer fired or the batch filled up
+        batch = self._match_batches.pop(language, None)
+        timer = self._match_batch_timers.pop(language, None)
+        if timer is not None:
+            # a batch dispatched because it filled up must not leave its timer to cut the next one short
+            timer.cancel()
+        if batch:
+            # the loop only keeps weak references to tasks
+            task = asyncio.ensure_future(self._run_match_batch(language, batch))
+            self._match_batch_tasks.add(task)
+            task.add_done_callback(self._match_batch_tasks.discard)
+
+    async def _run_match_batch(self, language: str, batch: List[Tuple[str, "asyncio.Future"]]):
+        try:
+            matches = await asyncio.to_thread(self.find_best_match_batch, [query for query, _ in batch], language)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        for (_, future), match in zip(batch, matches):
+            if not future.done():
+                future.set_result(match)
+
+    def _vectorize_queries(self, texts: List[str]) -> np.ndarray:
+        """Several texts through the query embedding cache: only the misses go to the model, in one encode."""
+        cache = self._query_embed_cache
+        generation = cache.generation
+        found = [cache.get(text) for text in texts]
+        missing = list(dict.fromkeys(text for text, emb in zip(texts, found) if emb is _MISS))
+        if missing:
+            fresh = dict(zip(missing, self._vectorize_np(missing)))
+            for text, emb in fresh.items():
+                cache.set(text, emb, generation)
+            found = [fresh[text] if emb is _MISS else emb for text, emb in zip(texts, found)]
+        return np.stack(found)
+
+    def _find_best_matches_uncached(self, queries: List[str], language: str) -> List[Optional[Dict[str, Any]]]:
         N_CANDIDATES = 5
-        RE_RANKING_THRESHOLD = 0.70
 
-        print(f"\n--- Starting Two-Phase Search for Q&A (Language: {language.upper()}) ---")
-        print(f"Original Query: '{query}'")
+        stripped_queries = [self._get_stripped_text(query) for query in queries]
+        query_embeddings = self._vectorize_queries(stripped_queries).tolist()
 
-        stripped_query = self._get_stripped_text(query)
-        
-        query_embedding = self._vectorize(stripped_query).tolist()
-        
+        # one Chroma call for the whole batch: results hold one candidate list per query
         results = self.qa_collection.query(
-            query_embeddings=[query_embedding], 
+            query_embeddings=query_embeddings,
             n_results=N_CANDIDATES,
             where={"language": language}
         )
-        
-        if not results or not results["ids"] or not results["ids"][0]:
+        return [self._pick_match(query, language, results, qi) for qi, query in enumerate(queries)]
+
+    def _pick_match(self, query: str, language: str, results: Dict[str, Any], qi: int) -> Optional[Dict[str, Any]]:
+        RE_RANKING_THRESHOLD = 0.70
+
+        print(f"\n--- Starting Two-Phase Search for Q&A (Language: {language.upper()}) ---")
+        print(f"Original Query: '{query}'")
+
+        if not results or not results["ids"] or not results["ids"][qi]:
             print("--- Phase 1: No candidates found for this language. Aborting search. ---")
             return None
 
         print(f"\n--- Phase 1 (Retrieval) Results ---")
-        num_candidates = len(results["ids"][0])
+        num_candidates = len(results["ids"][qi])
         print(f"Found {num_candidates} potential candidates from vector search.")
         candidates = []
         for i in range(num_candidates):
-            meta = results["metadatas"][0][i]
-            dist = results["distances"][0][i]
+            meta = results["metadatas"][qi][i]
+            dist = results["distances"][qi][i]
             candidates.append(meta)
             print(f"  - L2 Dist: {dist:.4f} | Q: '{meta['original_question']}'")
 
+        # Early accept only for an exact (case/whitespace-insensitive) match of the raw question:
+        # stripped texts collapse e.g. "who is X" / "where is X", so a small Phase 1 distance alone
+        # does not decide. Identical raw text means cosine 1, which Phase 2 could not beat anyway.
+        normalized_query = " ".join(query.lower().split())
+        for i, candidate in enumerate(candidates):
+            if results["distances"][qi][i] >= settings.EARLY_ACCEPT_DISTANCE:
+                break
+            if " ".join(candidate["original_question"].lower().split()) == normalized_query:
+                print(f"\n--- Early accept: exact question match (Phase 1 distance {results['distances'][qi][i]:.4f}), skipping Phase 2 ---")
+                return {
+                    "qa_id": candidate["qa_id"],
+                    "language": candidate["language"],
+                    # same cosine-based distance as the Phase 2 path (1 - similarity)
+                    "distance": 0.0
+                }
+
         print("\n--- Phase 2 (Re-ranking) ---")
         
         original_candidate_questions = [c["original_question"] for c in candidates]
-        query_vec = self._vectorize(query)
-        candidate_vecs = self._vectorize(original_candidate_questions)
-        cosine_scores = util.cos_sim(query_vec, candidate_vecs)[0]
+        # candidates recur across queries: their embeddings come from the fp16 store, only new ones are encoded
+        query_vec, candidate_vecs = self._rerank_vectors(query, original_candidate_questions)
+        # candidate rows are already unit length: cosine is one matrix-vector product, no per-call norm pass
+        cosine_scores = candidate_vecs @ _unit_rows(query_vec)
         
         print(f"Comparing original query against candidates (Cosine Similarity):")
         
-        best_score_idx = torch.argmax(cosine_scores).item()
-        best_score = cosine_scores[best_score_idx].item()
+        best_score_idx = int(cosine_scores.argmax())
+        best_score = float(cosine_scores[best_score_idx])
         best_candidate = candidates[best_score_idx]
 
         for i, score in enumerate(cosine_scores):
             is_best = "<- BEST" if i == best_score_idx else ""
-            print(f"  - Score: {score.item():.4f} | Q: '{original_candidate_questions[i]}' {is_best}")
+            print(f"  - Score: {score:.4f} | Q: '{original_candidate_questions[i]}' {is_best}")
 
         print("\n--- Final Decision ---")
         if best_score >= RE_RANKING_THRESHOLD:
@@ -154,25 +722,110 @@ class SemanticSearchService:
             print(f":x: No confident match. Best score ({best_score:.4f}) is below threshold ({RE_RANKING_THRESHOLD}).")
             return None
 
+    def embed_query(self, text: str) -> List[float]:
+        """Query-time embedding through the query cache (e.g. the same message already embedded for search)."""
+        return self._vectorize_query(text).tolist()
+
+    def embed_texts(self, texts: List[str], batch_size: int = 64) -> List[List[float]]:
+        return self._vectorize(texts, batch_size=batch_size).tolist()
+
+    async def aembed_texts(self, texts: List[str], batch_size: int = 64) -> List[List[float]]:
+        # Ingest-time embeddings go to the batch embedder service when configured;
+        # query-time search keeps using the local model.
+        if not settings.EMBED_SERVICE_URL:
+            return await asyncio.to_thread(self.embed_texts, texts, batch_size)
+        if self._embed_http is None:
+            self._embed_http = httpx.AsyncClient(timeout=120.0)
+        response = await self._embed_http.post(
+            settings.EMBED_SERVICE_URL,
+            json={"texts": texts, "batch_size": settings.EMBED_SERVICE_BATCH_SIZE},
+        )
+        response.raise_for_status()
+        embeddings = response.json()["embeddings"]
+        if len(embeddings) != len(texts):
+            raise ValueError(f"Embed service returned {len(embeddings)} vectors for {len(texts)} texts")
+        return embeddings
+
+    @staticmethod
+    def _document_chunk_id(document_id: str, chunk: str) -> str:
+        return f"{document_id}:{hashlib.blake2b(chunk.encode('utf-8'), digest_size=16).hexdigest()}"
+
+    def add_document_chunks(
+        self, chunks: List[str], embeddings: List[List[float]], document_id: str, language: str
+    ) -> List[str]:
+        # id = document + chunk content hash: re-indexing the same document overwrites its vectors
+        # via upsert instead of adding duplicates. Repeated chunk texts collapse into one entry.
+        rows: Dict[str, int] = {}
+        for i, chunk in enumerate(chunks):
+            rows.setdefault(self._document_chunk_id(document_id, chunk), i)
+        if not rows:
+            return []
+
+        self.document_collection.upsert(
+            ids=list(rows),
+            embeddings=[embeddings[i] for i in rows.values()],
+            metadatas=[{"document_id": document_id, "chunk_text": chunks[i], "language": language} for i in rows.values()]
+        )
+        return list(rows)
+
+    def _document_chunk_ids(self, document_id: str) -> List[str]:
+        return self.document_collection.get(where={"document_id": document_id}, include=[])["ids"]
+
+    def _delete_stale_document_chunks(self, document_id: str, previous_ids: List[str], current_ids: Iterable[str]):
+        # chunks that no longer exist: old uuid4 ids, or boundaries moved by a chunker change
+        stale = set(previous_ids).difference(current_ids)
+        if stale:
+            print(f"Removing {len(stale)} stale chunks of document {document_id}.")
+            self.document_collection.delete(ids=list(stale))
+
     def index_document_chunks(self, chunks: List[str], document_id: str, language: str):
+        """(Re-)index a whole document like update_qa_pairs_batch: upsert current chunks, then delete the rest."""
         print(f"Indexing {len(chunks)} chunks for document {document_id} (Language: {language.upper()})...")
-        chunk_embeddings = self._vectorize(chunks).tolist()
-        chunk_ids = [str(uuid.uuid4()) for _ in chunks]
-        metadatas = [{"document_id": document_id, "chunk_text": chunk, "language": language} for chunk in chunks]
-        
-        self.document_collection.add(
-            ids=chunk_ids,
-            embeddings=chunk_embeddings,
-            metadatas=metadatas
-        )
+        previous_ids = self._document_chunk_ids(document_id)
+        written = self.add_document_chunks(chunks, self.embed_texts(chunks), document_id, language)
+        self._delete_stale_document_chunks(document_id, previous_ids, written)
         print("Indexing complete.")
 
+    def _padded_lengths(self, texts: List[str]) -> List[int]:
+        """Token count each text is padded to inside a batch (capped at the model's max_seq_length)."""
+        tokenizer = getattr(self.model, "tokenizer", None)
+        if tokenizer is None:
+            return [len(text) for text in texts]
+        cap = getattr(self.model, "max_seq_length", None) or tokenizer.model_max_length
+        input_ids = tokenizer(texts, add_special_tokens=False, truncation=False)["input_ids"]
+        return [min(len(ids), cap) for ids in input_ids]
+
+    async def index_document_chunks_stream(
+        self, chunks: List[str], document_id: str, language: str, batch_size: int = 64
+    ) -> AsyncIterator[Tuple[int, int]]:
+        # Fixed-size micro-batches keep the encoder at a steady load instead of one
+        # huge tensor; yields (done, total) after each batch for progress reporting.
+        # encode() only length-sorts within one call, so chunks are sorted by token length up front:
+        # each micro-batch then holds similar lengths and pads far less. Chunk order is not stored.
+        lengths = await asyncio.to_thread(self._padded_lengths, chunks)
+        chunks = [chunks[i] for i in sorted(range(len(chunks)), key=lengths.__getitem__)]
+        total = len(chunks)
+        done = 0
+        previous_ids = await asyncio.to_thread(self._document_chunk_ids, document_id)
+        written: set = set()
+        for i in range(0, total, batch_size):
+            batch = chunks[i:i + batch_size]
+            embeddings = await self.aembed_texts(batch, batch_size)
+            written.update(await asyncio.to_thread(self.add_document_chunks, batch, embeddings, document_id, language))
+            done += len(batch)
+            yield done, total
+        # only after every batch is in: an interrupted re-index keeps the old chunks searchable
+        await asyncio.to_thread(self._delete_stale_document_chunks, document_id, previous_ids, written)
+
+    async def asearch_documents(self, query: str, language: str) -> List[str]:
+        return await asyncio.to_thread(self.search_documents, query, language)
+
     def search_documents(self, query: str, language: str) -> List[str]:
         print(f"\n--- Searching Documents for query (Language: {language.upper()}): '{query}' ---")
         N_CHUNKS_TO_RETURN = 3
         SIMILARITY_THRESHOLD = 0.50
 
-        query_embedding = self._vectorize(query)
+        query_embedding = self._vectorize_query(query)
         
         results = self.document_collection.query(
             query_embeddings=[query_embedding.tolist()],
@@ -185,10 +838,12 @@ class SemanticSearchService:
             return []
 
         candidate_chunks = [meta["chunk_text"] for meta in results["metadatas"][0]]
-        
-        candidate_embeddings = self._vectorize(candidate_chunks)
-        cosine_scores = util.cos_sim(query_embedding, candidate_embeddings)[0]
-        best_score = torch.max(cosine_scores).item()
+
+        if self._documents_cosine:
+            # chunks were indexed with the same raw-text embeddings, so no second encode is needed
+            best_score = 1 - min(results["distances"][0])
+        else:
+            best_score = float(_cosine_scores(query_embedding, self._vectorize_np(candidate_chunks)).max())
         
         if best_score < SIMILARITY_THRESHOLD:
             print(":No confident document match. Best score is below threshold.")
@@ -197,4 +852,7 @@ class SemanticSearchService:
         print(f"Confident match found. Returning {len(candidate_chunks)} chunks for RAG.")
         return candidate_chunks
 
-search_service: SemanticSearchService = None
\ No newline at end of file
+# One shared instance (and one loaded model) for the whole process
+@lru_cache(maxsize=1)
+def get_service() -> SemanticSearchService:
+    return SemanticSearchService()
\ No newline at end of file
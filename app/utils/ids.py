@@ -0,0 +1,68 @@
+import os
+import threading
+import time
+from typing import List
+
+# Crockford base32 (be I, L, O, U), kaip ULID specifikacijoje
+_ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+# 10 bitų -> 2 simboliai: koduojama po du simbolius vienu žingsniu
+_PAIRS = [a + b for a in _ALPHABET for b in _ALPHABET]
+_RAND_MAX = (1 << 80) - 1
+_lock = threading.Lock()
+_last_ms = 0
+_last_rand = 0
+
+
+def _encode_time(ms: int) -> str:
+    # 48 bitų laiko žymė -> 10 simbolių
+    p = _PAIRS
+    return p[ms >> 40 & 1023] + p[ms >> 30 & 1023] + p[ms >> 20 & 1023] + p[ms >> 10 & 1023] + p[ms & 1023]
+
+
+def _encode_rand(r: int) -> str:
+    # 80 atsitiktinių bitų -> 16 simbolių
+    p = _PAIRS
+    return (
+        p[r >> 70 & 1023] + p[r >> 60 & 1023] + p[r >> 50 & 1023] + p[r >> 40 & 1023]
+        + p[r >> 30 & 1023] + p[r >> 20 & 1023] + p[r >> 10 & 1023] + p[r & 1023]
+    )
+
+
+def _reserve(count: int):
+    """Grąžina (ms, pirmoji atsitiktinė dalis) `count` iš eilės einantiems ULID."""
+    global _last_ms, _last_rand
+    now_ms = time.time_ns() // 1_000_000
+    with _lock:
+        # laikrodis pasukus atgal laiko žymė nemažėja – kitaip nauji ULID rikiuotųsi prieš senesnius
+        ms = max(now_ms, _last_ms)
+        if ms == _last_ms and _last_rand + count > _RAND_MAX:
+            # atsitiktinė dalis išnaudota šiai milisekundei – pereinama į kitą
+            ms += 1
+        if ms == _last_ms:
+            rand = _last_rand + 1
+        else:
+            rand = int.from_bytes(os.urandom(10), "big")
+            # kad visas batch'as tilptų be perpildymo
+            if rand + count > _RAND_MAX:
+                rand = _RAND_MAX - count + 1
+        _last_ms, _last_rand = ms, rand + count - 1
+    return ms, rand
+
+
+def new_ulid() -> str:
+    """
+    26 simbolių ULID: 48 bitų laiko žymė (ms) + 80 atsitiktinių bitų.
+    Tos pačios milisekundės ribose atsitiktinė dalis didinama vienetu, todėl
+    raktai monotoniški ir nauji įrašai rašomi į B-medžio indekso dešinį kraštą.
+    """
+    ms, rand = _reserve(1)
+    return _encode_time(ms) + _encode_rand(rand)
+
+
+def new_ulids(count: int) -> List[str]:
+    """`count` monotoniškų ULID vienu kartu (importams): vienas užraktas ir os.urandom kvietimas."""
+    if count <= 0:
+        return []
+    ms, rand = _reserve(count)
+    prefix = _encode_time(ms)
+    return [prefix + _encode_rand(r) for r in range(rand, rand + count)]
@@ -0,0 +1,79 @@
+import mimetypes
+import os
+import re
+
+from starlette.datastructures import Headers
+from starlette.responses import FileResponse, Response
+from starlette.staticfiles import NotModifiedResponse, StaticFiles
+
+# failo varde turinio hash'as (pvz., app.3f9a2c1b.js) – turinys niekada nesikeičia
+_HASHED_NAME_RE = re.compile(r"\.[0-9a-f]{8,}\.")
+# iš anksto suspausti failai šalia originalo (pvz., app.js.br / app.js.gz), pirmenybės tvarka
+_PRECOMPRESSED = (("br", ".br"), ("gzip", ".gz"))
+
+
+def _encoding_qvalues(header: str) -> dict:
+    """Accept-Encoding -> {koduotė: q}; be q – 1.0, neteisinga q reikšmė – 0 (nepriimama)."""
+    qvalues = {}
+    for item in header.split(","):
+        coding, _, params = item.partition(";")
+        coding = coding.strip().lower()
+        if not coding:
+            continue
+        q = 1.0
+        for param in params.split(";"):
+            name, _, value = param.partition("=")
+            if name.strip().lower() == "q":
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        qvalues[coding] = q
+    return qvalues
+
+
+class CachedStaticFiles(StaticFiles):
+    """
+    StaticFiles su Cache-Control antraštėmis ir iš anksto suspaustais (.br / .gz) failais,
+    jei klientas juos priima (Accept-Encoding). ETag / 304 lieka kaip Starlette.
+    """
+
+    def __init__(self, *args, max_age: int = 3600, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.max_age = max_age
+
+    def file_response(self, full_path, stat_result, scope, status_code: int = 200) -> Response:
+        request_headers = Headers(scope=scope)
+        qvalues = _encoding_qvalues(request_headers.get("accept-encoding", ""))
+        media_type = mimetypes.guess_type(str(full_path))[0] or "text/plain"
+
+        response = None
+        # tik koduotės su q > 0 (tiesiogiai arba per "*"); didesnis q pirmiau, lygiems – _PRECOMPRESSED tvarka
+        candidates = [
+            (qvalues.get(encoding, qvalues.get("*", 0.0)), encoding, suffix) for encoding, suffix in _PRECOMPRESSED
+        ]
+        for q, encoding, suffix in sorted(candidates, key=lambda c: -c[0]):
+            if q <= 0:
+                continue
+            try:
+                compressed_stat = os.stat(f"{full_path}{suffix}")
+            except OSError:
+                continue
+            response = FileResponse(
+                f"{full_path}{suffix}", status_code=status_code,
+                stat_result=compressed_stat, media_type=media_type,
+            )
+            response.headers["content-encoding"] = encoding
+            break
+        if response is None:
+            response = FileResponse(full_path, status_code=status_code, stat_result=stat_result, media_type=media_type)
+
+        response.headers["vary"] = "Accept-Encoding"
+        if _HASHED_NAME_RE.search(os.path.basename(str(full_path))):
+            response.headers["cache-control"] = "public, max-age=31536000, immutable"
+        else:
+            response.headers["cache-control"] = f"public, max-age={self.max_age}"
+
+        if self.is_not_modified(response.headers, request_headers):
+            return NotModifiedResponse(response.headers)
+        return response